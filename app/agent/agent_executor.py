@@ -1,77 +1,222 @@
+import asyncio
+import datetime
+import logging
+import time
+import uuid
 from sqlalchemy.orm import Session
-from app.db import crud
-from app.agent.graph import compiled_graph, AgentState # Import compiled graph and state
+from app.db import crud, models
+from app.core.config import settings
+from app.core.deadline import deadline_after, remaining, set_deadline, reset_deadline
+from app.core.telemetry import span, increment, record_llm_usage
+from app.schemas import ChatMessageOutput
+from app.agent.graph import compiled_graph, AgentState, TIMEOUT_ANSWER, get_llm # Import compiled graph and state
+from app.agent.checkpoint import checkpointer
+from app.agent.prefetch import start_prefetch, end_prefetch
+from app.jobs.queue import turn_jobs
+from app.agent.router import route_query, record_route, RouteDecision, ROUTE_AGENT, ROUTE_SMALL_TALK
 # Add SystemMessage import
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
-async def run_agent(input_message: str, conversation_id: int, user_id: int, db: Session) -> str:
+logger = logging.getLogger(__name__)
+
+# Extra time past the deadline before the graph run is abandoned outright. The
+# graph normally finishes on its own: nodes answer early once the budget is low.
+HARD_STOP_GRACE_SECONDS = 2.0
+
+SYSTEM_PROMPT = (
+    "You are a helpful and conversational AI assistant. Your primary goal is to provide accurate and relevant information.\n\n"
+    "**Conversational Interaction:**\n"
+    "- Answer simple greetings (hello, how are you), expressions of gratitude (thank you), and direct questions about your AI nature conversationally *without* using tools.\n\n"
+    "**Tool Usage Guidelines:**\n"
+    "- **InternalKnowledgeSearch:** Use this tool FIRST if the user's query seems to relate specifically to internal documents, procedures, or data explicitly provided to you.\n"
+    "- **WebSearch:** Use this tool when the user asks for:\n"
+    "    - Specific, factual information about recent events (e.g., news, sports results, recent developments).\n"
+    "    - Real-time information (e.g., stock prices - though acknowledge limitations, weather).\n"
+    "    - Information about entities or topics likely not in your training data or the internal knowledge base.\n"
+    "- **Crucially:** If you realize you lack the necessary up-to-date or specific information to answer a factual question accurately based on your internal knowledge, **use the WebSearch tool to find the answer** instead of stating you don't have access.\n\n"
+    "**Important Execution Note:** When you determine a tool is needed based on the guidelines, invoke the correct tool function with the necessary arguments. Your response structure should facilitate this tool invocation.\n\n" 
+    "**Context and Queries:**\n"
+    "- Always pay close attention to the entire conversation history to understand context and resolve pronouns (he, she, it, they).\n"
+    "- When using a tool, formulate a specific search query based on the entities and details discussed in the conversation (e.g., for 'when did he score last?' after discussing Messi, search 'Lionel Messi last goal date')."
+)
+
+# Prompts for the router's fast paths (no tools bound)
+SMALL_TALK_PROMPT = (
+    "You are a friendly, helpful AI assistant. Reply briefly and conversationally. "
+    "If the user asks for information, invite them to ask their question."
+)
+NO_ANSWER_MARKER = "NO_ANSWER"
+KNOWLEDGE_PROMPT = (
+    "You are a helpful AI assistant. Answer the user's question using the internal knowledge base excerpts below. "
+    f"If the excerpts do not contain the answer, reply with exactly {NO_ANSWER_MARKER} and nothing else.\n\n"
+    "Excerpts:\n{context}"
+)
+
+async def run_agent(
+    input_message: str, conversation_id: int, user_id: int, db: Session, deadline: Optional[float] = None
+) -> ChatMessageOutput:
     """
-    Runs the LangGraph agent for a given message and conversation.
-    Manages history and invokes the compiled graph.
+    Answers a message in a conversation: loads the history, routes the message
+    (small talk and confident knowledge-base questions skip the tool-using
+    graph), and saves the exchange. Runs within the request's time budget
+    (`deadline`, absolute time.time(); defaults to agent_request_timeout_seconds from now).
     """
-    print(f"--- Running Agent for User ID: {user_id}, Conversation ID: {conversation_id} ---")
-    print(f"Input Message: {input_message}")
+    logger.info("Running agent user_id=%s conversation_id=%s", user_id, conversation_id)
+    started = time.perf_counter()
+    if deadline is None:
+        deadline = deadline_after(settings.agent_request_timeout_seconds)
 
     # 1. Get conversation history
-    history: List[BaseMessage] = crud.get_messages_for_conversation(
-        db=db,
-        user_id=user_id, # Pass the user ID
-        conversation_id=conversation_id # Pass the conversation ID
+    with span("agent.history_load"):
+        history: List[BaseMessage] = crud.get_messages_for_conversation(
+            db=db,
+            user_id=user_id, # Pass the user ID
+            conversation_id=conversation_id # Pass the conversation ID
+        )
+    logger.debug("Retrieved %d messages from history", len(history))
+    # Release the pooled connection for the (long) graph run; the session reconnects to save messages
+    db.close()
+
+    # 2. Pick a route; the fast paths fall back to the graph if they can't answer
+    decision = await asyncio.to_thread(
+        route_query, input_message, bool(history), bool(history) and isinstance(history[-1], AIMessage)
     )
-    print(f"Retrieved {len(history)} messages from history.")
-
-    # === ADD/DEFINE SYSTEM PROMPT ===
-    system_prompt_content = (
-        "You are a helpful and conversational AI assistant. Your primary goal is to provide accurate and relevant information.\n\n"
-        "**Conversational Interaction:**\n"
-        "- Answer simple greetings (hello, how are you), expressions of gratitude (thank you), and direct questions about your AI nature conversationally *without* using tools.\n\n"
-        "**Tool Usage Guidelines:**\n"
-        "- **InternalKnowledgeSearch:** Use this tool FIRST if the user's query seems to relate specifically to internal documents, procedures, or data explicitly provided to you.\n"
-        "- **WebSearch:** Use this tool when the user asks for:\n"
-        "    - Specific, factual information about recent events (e.g., news, sports results, recent developments).\n"
-        "    - Real-time information (e.g., stock prices - though acknowledge limitations, weather).\n"
-        "    - Information about entities or topics likely not in your training data or the internal knowledge base.\n"
-        "- **Crucially:** If you realize you lack the necessary up-to-date or specific information to answer a factual question accurately based on your internal knowledge, **use the WebSearch tool to find the answer** instead of stating you don't have access.\n\n"
-        "**Important Execution Note:** When you determine a tool is needed based on the guidelines, invoke the correct tool function with the necessary arguments. Your response structure should facilitate this tool invocation.\n\n" 
-        "**Context and Queries:**\n"
-        "- Always pay close attention to the entire conversation history to understand context and resolve pronouns (he, she, it, they).\n"
-        "- When using a tool, formulate a specific search query based on the entities and details discussed in the conversation (e.g., for 'when did he score last?' after discussing Messi, search 'Lionel Messi last goal date')."
+    ai_response_text, degraded = None, False
+    if decision.route != ROUTE_AGENT:
+        ai_response_text = await _answer_on_fast_path(decision, history, input_message, deadline)
+        if ai_response_text is None:
+            decision = RouteDecision(ROUTE_AGENT, f"{decision.route}_fallback")
+    run_id, pending_jobs = None, []
+    if ai_response_text is None:
+        if settings.checkpointing_enabled:
+            # Checkpointed under this id, so the turn can be resumed if it is cut short
+            run_id = uuid.uuid4().hex
+            crud.create_agent_run(db, run_id, conversation_id, user_id, input_message)
+            db.close()
+        with turn_jobs(user_id) as jobs: # Background jobs started by tools are owned by the user
+            ai_response_text, degraded = await _run_tracked(
+                db, run_id, _initial_state(history, input_message, deadline), deadline, conversation_id,
+                prefetch_query=input_message, unsaved_question=input_message,
+            )
+        pending_jobs = jobs.pending
+
+    # 3. Save the user message and the AI response to the database
+    # Make sure not to save the initial system prompt to the DB history
+    with span("db.save_messages"):
+        crud.add_message(db, conversation_id, sender='user', text=input_message)
+        crud.add_message(db, conversation_id, sender='ai', text=ai_response_text)
+
+    record_route(decision, time.perf_counter() - started)
+    return ChatMessageOutput(
+        ai_response=ai_response_text, conversation_id=conversation_id, degraded=degraded, run_id=run_id,
+        pending_jobs=pending_jobs,
     )
-    system_message = SystemMessage(content=system_prompt_content)
 
-    # 2. Format input for the graph (PREPEND System Prompt)
+
+async def _answer_on_fast_path(
+    decision: RouteDecision, history: List[BaseMessage], input_message: str, deadline: float
+) -> Optional[str]:
+    """
+    One LLM call without tools and with only the last few history messages:
+    a short conversational prompt for small talk, or the pre-fetched knowledge
+    base excerpts for knowledge questions. Returns None if the graph should answer instead.
+    """
+    keep = settings.router_fast_path_history_messages
+    recent_history = history[-keep:] if keep > 0 else []
+    if decision.route == ROUTE_SMALL_TALK:
+        system_prompt = SMALL_TALK_PROMPT
+    else:
+        context = "\n---\n".join(chunk for _, chunk in decision.rag_results)
+        system_prompt = KNOWLEDGE_PROMPT.format(context=context)
+    messages = [SystemMessage(content=system_prompt)] + recent_history + [HumanMessage(content=input_message)]
+
+    try:
+        with span("llm.call", **{"llm.messages": len(messages), "llm.route": decision.route}) as llm_span:
+            response = await get_llm().ainvoke(messages, timeout=max(1.0, remaining(deadline)))
+            record_llm_usage(response, llm_span)
+    except Exception:
+        logger.exception("Fast path (%s) failed; falling back to the agent", decision.route)
+        return None
+
+    text = str(response.content).strip()
+    if not text or text == NO_ANSWER_MARKER:
+        return None
+    return text
+
+
+def _initial_state(history: List[BaseMessage], input_message: str, deadline: float) -> AgentState:
+    system_message = SystemMessage(content=SYSTEM_PROMPT)
+
+    # Format input for the graph (PREPEND System Prompt)
     current_human_message = HumanMessage(content=input_message)
     # Ensure system prompt is always the very first message
     graph_input_messages = [system_message] + history + [current_human_message]
 
-    # === Add logging to verify messages ===
-    print("--- Messages being sent to graph: ---")
-    for i, msg in enumerate(graph_input_messages):
-        print(f"  {i}: [{msg.type}] {str(msg.content)[:100]}...")
-    # === End logging ===
+    # === Add logging to verify messages (only formatted when DEBUG is on) ===
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, msg in enumerate(graph_input_messages):
+            logger.debug("Graph input %d: [%s] %s", i, msg.type, str(msg.content)[:100])
+
+    return {"messages": graph_input_messages, "deadline": deadline, "degraded": None}
 
 
-    # 3. Prepare the initial state for the graph
-    initial_state: AgentState = {"messages": graph_input_messages}
+def _graph_config(run_id: Optional[str], checkpoint_id: Optional[str] = None) -> Dict[str, Any]:
+    config: Dict[str, Any] = {"recursion_limit": 15}
+    if run_id is not None: # The run id is the LangGraph thread id of its checkpoints
+        config["configurable"] = {"thread_id": run_id}
+        if checkpoint_id is not None:
+            config["configurable"]["checkpoint_id"] = checkpoint_id
+    return config
+
+
+async def _run_graph(
+    graph_input: Optional[AgentState], deadline: float, conversation_id: int,
+    run_id: Optional[str] = None, checkpoint_id: Optional[str] = None, prefetch_query: Optional[str] = None,
+) -> Tuple[str, bool, bool]:
+    """
+    Runs the tool-using graph, from `graph_input` or, when it is None, onward from
+    the run's latest checkpoint (or from `checkpoint_id`).
+    Returns (response text, degraded, timed out).
+    """
+    config = _graph_config(run_id, checkpoint_id)
+
+    # Run the graph asynchronously, keeping the latest state in case the hard stop hits
+    if graph_input is not None:
+        final_state: AgentState = graph_input
+    else:
+        final_state = (await compiled_graph.aget_state(config)).values
 
-    # 4. Define runtime configuration (e.g., recursion limit)
-    config = {"recursion_limit": 15}
+    async def _stream_graph():
+        nonlocal final_state
+        async for state in compiled_graph.astream(graph_input, config=config, stream_mode="values"):
+            final_state = state
 
-    # 5. Invoke the graph asynchronously
-    print("--- Invoking LangGraph ---")
-    final_state: AgentState = await compiled_graph.ainvoke(initial_state, config=config)
-    print("--- LangGraph Invocation Complete ---")
+    deadline_token = set_deadline(deadline) # Read by nodes, tools and HTTP fetches (copied into worker threads)
+    prefetch_token = start_prefetch(prefetch_query) if prefetch_query else None # Knowledge-base search during the first LLM call
+    timed_out = False
+    try:
+        with span("agent.graph"):
+            await asyncio.wait_for(_stream_graph(), timeout=max(0.1, remaining(deadline) + HARD_STOP_GRACE_SECONDS))
+    except asyncio.TimeoutError:
+        timed_out = True
+        logger.warning("Agent run exceeded its deadline conversation_id=%s", conversation_id)
+        increment("agent_degraded_total", "Agent turns answered early because of the deadline", reason="hard_timeout")
+    finally:
+        end_prefetch(prefetch_token)
+        reset_deadline(deadline_token)
+    degraded = timed_out or bool(final_state.get("degraded"))
 
-    # 6. Extract the final AI response (logic remains the same)
+    # Extract the final AI response (logic remains the same)
     ai_response_message: BaseMessage = final_state['messages'][-1]
 
-    if isinstance(ai_response_message, AIMessage):
+    if timed_out:
+        ai_response_text = TIMEOUT_ANSWER
+    elif isinstance(ai_response_message, AIMessage):
         ai_response_text = ai_response_message.content
-        print(f"Final AI Response: {ai_response_text[:150]}...")
     else:
         # ... (fallback logic) ...
-        print(f"Warning: Last message was not AIMessage: {type(ai_response_message)}")
+        logger.warning("Last message was not AIMessage: %s", type(ai_response_message).__name__)
         ai_response_text = "Error: Could not determine AI response."
         for msg in reversed(final_state['messages']):
              if isinstance(msg, AIMessage):
@@ -81,10 +226,122 @@ async def run_agent(input_message: str, conversation_id: int, user_id: int, db:
         if ai_response_text.startswith("Error:"):
              ai_response_text = "I encountered an issue processing the final response."
 
-    # 7. Save the user message and the AI response to the database
-    # Make sure not to save the initial system prompt to the DB history
-    crud.add_message(db, conversation_id, sender='user', text=input_message)
-    crud.add_message(db, conversation_id, sender='ai', text=ai_response_text)
-    print("--- User and AI messages saved to DB ---")
+    return ai_response_text, degraded, timed_out
+
+
+async def _run_tracked(
+    db: Session, run_id: Optional[str], graph_input: Optional[AgentState], deadline: float, conversation_id: int,
+    prefetch_query: Optional[str] = None, unsaved_question: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """
+    Runs the graph and records the run's outcome: completed, interrupted (hard
+    timeout or cancelled, e.g. the client disconnected) or failed.
+    An interrupted run has its question saved to the conversation (resume_run
+    relies on that), so `unsaved_question` is saved if the run is cancelled.
+    """
+    try:
+        text, degraded, timed_out = await _run_graph(graph_input, deadline, conversation_id, run_id, prefetch_query=prefetch_query)
+    except asyncio.CancelledError:
+        # Not an Exception subclass: without this the run would stay "running" until it goes stale
+        if run_id is not None:
+            if unsaved_question is not None:
+                crud.add_message(db, conversation_id, sender='user', text=unsaved_question)
+            crud.set_agent_run_status(db, run_id, "interrupted")
+        raise
+    except Exception:
+        if run_id is not None:
+            crud.set_agent_run_status(db, run_id, "failed")
+        raise
+    if run_id is not None:
+        crud.set_agent_run_status(db, run_id, "interrupted" if timed_out else "completed")
+        if checkpointer.prune_due():
+            await asyncio.to_thread(checkpointer.prune)
+    return text, degraded
+
+
+# === Resuming and replaying checkpointed runs ===
+
+class RunNotResumableError(Exception):
+    """The run is completed, still running, or has no checkpoint left."""
+
+
+def _stale_before() -> datetime.datetime:
+    # A run whose worker died is still marked running; it counts as stopped once it has gone quiet
+    return datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=settings.agent_request_timeout_seconds + HARD_STOP_GRACE_SECONDS
+    )
+
+
+async def resume_run(run: models.AgentRun, db: Session, deadline: Optional[float] = None) -> ChatMessageOutput:
+    """
+    Continues an unfinished run from its last checkpoint, so tool results that
+    were already saved are not fetched again, then saves the exchange to the
+    conversation like a normal turn.
+    """
+    if deadline is None:
+        deadline = deadline_after(settings.agent_request_timeout_seconds)
+    previous_status = run.status
+    run_id, conversation_id, user_id, input_message = run.id, run.conversation_id, run.user_id, run.input_message
+    if not (await compiled_graph.aget_state(_graph_config(run_id))).values:
+        raise RunNotResumableError("The run has no checkpoint to resume from")
+    if not crud.claim_agent_run(db, run_id, _stale_before()):
+        raise RunNotResumableError(f"The run is {previous_status} and cannot be resumed")
+    db.close()
+
+    with turn_jobs(user_id) as jobs:
+        ai_response_text, degraded = await _run_tracked(
+            db, run_id, None, deadline, conversation_id,
+            unsaved_question=input_message if previous_status != "interrupted" else None,
+        )
+    with span("db.save_messages"):
+        if previous_status != "interrupted": # An interrupted turn already saved its question (and a fallback answer)
+            crud.add_message(db, conversation_id, sender='user', text=input_message)
+        crud.add_message(db, conversation_id, sender='ai', text=ai_response_text)
+    increment("agent_runs_resumed_total", "Agent runs resumed from a checkpoint", status=previous_status)
+    return ChatMessageOutput(
+        ai_response=ai_response_text, conversation_id=conversation_id, degraded=degraded, run_id=run_id,
+        pending_jobs=jobs.pending,
+    )
+
+
+async def replay_run(run: models.AgentRun, checkpoint_id: Optional[str] = None, deadline: Optional[float] = None) -> ChatMessageOutput:
+    """
+    Re-runs a turn from one of its checkpoints (default: the first one, i.e. the
+    whole turn with the original input). The checkpoint is copied to a thread of
+    its own and replayed there, so the run's checkpoints, its status and the
+    conversation are unchanged. Not allowed while the run is running.
+    """
+    if deadline is None:
+        deadline = deadline_after(settings.agent_request_timeout_seconds)
+    if run.status == "running" and run.updated_at is not None and run.updated_at >= _stale_before():
+        raise RunNotResumableError("The run is running; replay it once it has finished")
+    if checkpoint_id is None:
+        history = [snapshot async for snapshot in compiled_graph.aget_state_history(_graph_config(run.id))]
+        if not history:
+            raise RunNotResumableError("The run has no checkpoint to replay from")
+        checkpoint_id = history[-1].config["configurable"]["checkpoint_id"]
+
+    replay_thread = f"{run.id}:replay:{uuid.uuid4().hex[:12]}"
+    if await checkpointer.acopy_checkpoint(_graph_config(run.id, checkpoint_id), replay_thread) is None:
+        raise RunNotResumableError("Unknown checkpoint")
+    try:
+        text, degraded, _ = await _run_graph(None, deadline, run.conversation_id, replay_thread)
+    finally:
+        await checkpointer.adelete_thread(replay_thread) # Debug output only: nothing refers to it afterwards
+    increment("agent_runs_replayed_total", "Agent runs replayed from a checkpoint")
+    return ChatMessageOutput(ai_response=text, conversation_id=run.conversation_id, degraded=degraded, run_id=run.id)
+
 
-    return ai_response_text
\ No newline at end of file
+async def list_checkpoints(run_id: str) -> List[Dict[str, Any]]:
+    """The run's checkpoints, oldest first: id, step, source, next nodes, time and message count."""
+    checkpoints = []
+    async for snapshot in compiled_graph.aget_state_history(_graph_config(run_id)):
+        checkpoints.append({
+            "checkpoint_id": snapshot.config["configurable"]["checkpoint_id"],
+            "step": snapshot.metadata.get("step") if snapshot.metadata else None,
+            "source": snapshot.metadata.get("source") if snapshot.metadata else None,
+            "next": list(snapshot.next),
+            "created_at": snapshot.created_at,
+            "message_count": len(snapshot.values.get("messages", [])),
+        })
+    return list(reversed(checkpoints))
@@ -0,0 +1,364 @@
+"""
+LangGraph checkpointer backed by the application's SQLAlchemy database.
+
+The graph state is saved after every node, so an agent run interrupted by a
+crash, a timeout or an error can be resumed from its last checkpoint (or
+replayed from an earlier one) without redoing finished tool work.
+
+Storage is kept compact: channel values are stored once per channel version
+(a checkpoint only references versions, so unchanged channels are not written
+again), values are serialized with LangGraph's msgpack-based serializer and
+zlib-compressed (fast level) when large, and each put()/put_writes() is a
+single transaction with batched inserts.
+"""
+import asyncio
+import datetime
+import logging
+import random
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.telemetry import span, increment, observe
+from app.db import models
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+_COMPRESSED_SUFFIX = "+zlib"
+# checkpoint_write_bytes histogram buckets: 512 B to 1 MiB in steps of 4x
+_WRITE_BYTES_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 1048576)
+_checkpoints = models.GraphCheckpoint.__table__
+_blobs = models.GraphCheckpointBlob.__table__
+_writes = models.GraphCheckpointWrite.__table__
+
+
+def _insert(connection: Connection, table, rows: List[Dict[str, Any]], update_columns: Sequence[str] = ()) -> None:
+    """
+    Batched insert. Rows whose primary key already exists are skipped, or
+    updated when `update_columns` is given (native upsert on SQLite/PostgreSQL).
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        keys = [column.name for column in table.primary_key.columns]
+        if update_columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=keys, set_={name: statement.excluded[name] for name in update_columns}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=keys)
+        connection.execute(statement, rows)
+        return
+    # Other databases: row by row inside a savepoint
+    for row in rows:
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert(), row)
+        except IntegrityError:
+            if update_columns:
+                key = {column.name: row[column.name] for column in table.primary_key.columns}
+                connection.execute(
+                    table.update().filter_by(**key).values({name: row[name] for name in update_columns})
+                )
+
+
+class SQLAlchemyCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver storing checkpoints, channel blobs and task writes in three tables."""
+    def __init__(self, bind: Engine):
+        super().__init__()
+        self.engine = bind
+        self._last_prune = time.monotonic()
+        self._prune_lock = threading.Lock()
+
+    # === Serialization ===
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= settings.checkpoint_compress_min_bytes:
+            return type_ + _COMPRESSED_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(_COMPRESSED_SUFFIX):
+            type_, data = type_[:-len(_COMPRESSED_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # === Reads ===
+
+    def _tuple_from_row(self, connection: Connection, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = row.thread_id, row.checkpoint_ns, row.checkpoint_id
+        checkpoint: Checkpoint = self._load(row.type, row.checkpoint)
+
+        channel_values: Dict[str, Any] = {}
+        versions = [(channel, str(version)) for channel, version in checkpoint["channel_versions"].items()]
+        if versions:
+            blob_rows = connection.execute(
+                select(_blobs.c.channel, _blobs.c.type, _blobs.c.data).where(
+                    _blobs.c.thread_id == thread_id,
+                    _blobs.c.checkpoint_ns == checkpoint_ns,
+                    tuple_(_blobs.c.channel, _blobs.c.version).in_(versions),
+                )
+            )
+            for blob in blob_rows:
+                if blob.type != "empty":
+                    channel_values[blob.channel] = self._load(blob.type, blob.data)
+
+        write_rows = connection.execute(
+            select(_writes.c.task_id, _writes.c.channel, _writes.c.type, _writes.c.data)
+            .where(
+                _writes.c.thread_id == thread_id,
+                _writes.c.checkpoint_ns == checkpoint_ns,
+                _writes.c.checkpoint_id == checkpoint_id,
+            )
+            .order_by(_writes.c.task_id, _writes.c.idx)
+        )
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self._load(row.metadata_type, row.metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": row.parent_checkpoint_id}}
+                if row.parent_checkpoint_id else None
+            ),
+            pending_writes=[(w.task_id, w.channel, self._load(w.type, w.data)) for w in write_rows],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Returns the requested checkpoint, or the thread's latest one if no checkpoint_id is given."""
+        configurable = config["configurable"]
+        query = select(_checkpoints).where(
+            _checkpoints.c.thread_id == configurable["thread_id"],
+            _checkpoints.c.checkpoint_ns == configurable.get("checkpoint_ns", ""),
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(_checkpoints.c.checkpoint_id.desc()).limit(1)
+        with self.engine.connect() as connection:
+            row = connection.execute(query).first()
+            return self._tuple_from_row(connection, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Lists checkpoints, newest first."""
+        query = select(_checkpoints).order_by(_checkpoints.c.thread_id, _checkpoints.c.checkpoint_id.desc())
+        if config:
+            configurable = config["configurable"]
+            query = query.where(_checkpoints.c.thread_id == configurable["thread_id"])
+            if "checkpoint_ns" in configurable:
+                query = query.where(_checkpoints.c.checkpoint_ns == configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query = query.where(_checkpoints.c.checkpoint_id < before_id)
+        if limit is not None and not filter:
+            query = query.limit(limit)
+
+        with self.engine.connect() as connection:
+            results = []
+            for row in connection.execute(query).all():
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self._load(row.metadata_type, row.metadata)
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                results.append(self._tuple_from_row(connection, row))
+        yield from results
+
+    # === Writes ===
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Saves a checkpoint plus the channel values that changed since the previous one."""
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values: Dict[str, Any] = stored.pop("channel_values")
+
+        blob_rows = []
+        for channel, version in new_versions.items():
+            type_, data = self._dump(values[channel]) if channel in values else ("empty", b"")
+            blob_rows.append({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel,
+                              "version": str(version), "type": type_, "data": data})
+        type_, checkpoint_data = self._dump(stored)
+        metadata_type, metadata_data = self._dump(get_checkpoint_metadata(config, metadata))
+        checkpoint_row = {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": configurable.get("checkpoint_id"), "type": type_, "checkpoint": checkpoint_data,
+            "metadata_type": metadata_type, "metadata": metadata_data,
+        }
+
+        with span("checkpoint.put"), self.engine.begin() as connection:
+            _insert(connection, _blobs, blob_rows)
+            _insert(connection, _checkpoints, [checkpoint_row],
+                    update_columns=("parent_checkpoint_id", "type", "checkpoint", "metadata_type", "metadata"))
+        written = len(checkpoint_data) + len(metadata_data) + sum(len(row["data"]) for row in blob_rows)
+        observe("checkpoint_write_bytes", "Bytes written per checkpoint", written, buckets=_WRITE_BYTES_BUCKETS)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Saves a task's writes. Regular writes are kept if already stored; special ones (errors, interrupts) replace."""
+        configurable = config["configurable"]
+        key = {"thread_id": configurable["thread_id"], "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+               "checkpoint_id": configurable["checkpoint_id"], "task_id": task_id, "task_path": task_path}
+        regular, special = [], []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            (special if write_idx < 0 else regular).append(
+                {**key, "idx": write_idx, "channel": channel, "type": type_, "data": data}
+            )
+        with span("checkpoint.put_writes"), self.engine.begin() as connection:
+            _insert(connection, _writes, regular)
+            _insert(connection, _writes, special, update_columns=("channel", "type", "data", "task_path"))
+
+    def copy_checkpoint(self, config: RunnableConfig, thread_id: str) -> Optional[RunnableConfig]:
+        """
+        Copies one checkpoint (its channel values and pending writes) into another
+        thread as that thread's first checkpoint, e.g. to replay it without adding
+        to the original thread. Returns the copy's config, or None if not found.
+        """
+        source = self.get_tuple(config)
+        if source is None:
+            return None
+        checkpoint_ns = source.config["configurable"]["checkpoint_ns"]
+        copied = self.put(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}},
+            source.checkpoint, source.metadata, source.checkpoint["channel_versions"],
+        )
+        writes_by_task: Dict[str, List[Tuple[str, Any]]] = {}
+        for task_id, channel, value in source.pending_writes or ():
+            writes_by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            self.put_writes(copied, writes, task_id)
+        return copied
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.engine.begin() as connection:
+            for table in (_checkpoints, _blobs, _writes):
+                connection.execute(delete(table).where(table.c.thread_id == thread_id))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Same scheme as LangGraph's in-memory saver: zero-padded counter plus a random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # === Async variants (database work runs in a thread, off the event loop) ===
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def acopy_checkpoint(self, config: RunnableConfig, thread_id: str) -> Optional[RunnableConfig]:
+        return await asyncio.to_thread(self.copy_checkpoint, config, thread_id)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # === Retention ===
+
+    def prune_due(self, interval_seconds: float = 600.0) -> bool:
+        return time.monotonic() - self._last_prune >= interval_seconds
+
+    def prune(self) -> int:
+        """Deletes the checkpoints of threads idle for longer than checkpoint_retention_hours. Returns the thread count."""
+        if not self._prune_lock.acquire(blocking=False):
+            return 0 # Another thread is already pruning
+        try:
+            self._last_prune = time.monotonic()
+            cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.checkpoint_retention_hours)
+            with self.engine.begin() as connection:
+                latest = (
+                    select(_checkpoints.c.thread_id)
+                    .group_by(_checkpoints.c.thread_id)
+                    .having(func.max(_checkpoints.c.created_at) < cutoff)
+                )
+                thread_ids = [row.thread_id for row in connection.execute(latest)]
+                if thread_ids:
+                    for table in (_checkpoints, _blobs, _writes):
+                        connection.execute(delete(table).where(table.c.thread_id.in_(thread_ids)))
+            if thread_ids:
+                increment("checkpoint_pruned_threads_total", "Agent runs whose checkpoints were pruned", len(thread_ids))
+                logger.info("Pruned checkpoints of %d idle agent runs", len(thread_ids))
+            return len(thread_ids)
+        finally:
+            self._prune_lock.release()
+
+
+checkpointer = SQLAlchemyCheckpointSaver(engine)
@@ -1,103 +1,143 @@
+import logging
 import operator
+import threading
+import uuid
 from typing import TypedDict, Annotated, Sequence
-import re,json
-from typing import Optional, Tuple, Dict, Any
-from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, ToolMessage
+from typing import Optional, Dict, Any
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-import xml.etree.ElementTree as ET
-from langchain_core.messages import AIMessage, ToolMessage # Need ToolMessage later
-from langchain_core.agents import AgentAction, AgentFinish # Need these for structured output
 from app.agent.tools import agent_tools # Import the combined list of tools
+from app.agent.tool_call_parser import parse_tool_calls
 from app.core.config import settings
-from langchain_groq import ChatGroq
-
-# Initialize LLM
-llm = ChatGroq(
-    groq_api_key=settings.groq_api_key,
-    model_name="meta-llama/llama-4-scout-17b-16e-instruct", # Or your preferred model
-    temperature=0.1 # Adjust temperature as needed
-)
-
-# Bind tools to the LLM. The order might influence preference, but descriptions are key.
-llm_with_tools = llm.bind_tools(agent_tools)
+from app.core.telemetry import span, record_llm_usage, increment
+from app.core.deadline import remaining, current_deadline
+from app.agent.checkpoint import checkpointer
+
+logger = logging.getLogger(__name__)
+
+# The LLM client is created on first use (or by the startup warm-up), not at import time
+_llm = None
+_llm_with_tools = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Returns the shared ChatGroq client, creating it on first use."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_groq import ChatGroq
+                _llm = ChatGroq(
+                    groq_api_key=settings.groq_api_key,
+                    model_name="meta-llama/llama-4-scout-17b-16e-instruct", # Or your preferred model
+                    temperature=0.1 # Adjust temperature as needed
+                )
+    return _llm
+
+def set_chat_model(llm) -> None:
+    """
+    Replaces the chat model used by the agent (e.g. with an offline stand-in for
+    benchmarks). Must be called before the first request.
+    """
+    global _llm, _llm_with_tools
+    with _llm_lock:
+        _llm = llm
+        _llm_with_tools = None
+
+def get_llm_with_tools():
+    """Returns the LLM with the agent tools bound."""
+    global _llm_with_tools
+    if _llm_with_tools is None:
+        llm = get_llm()
+        with _llm_lock:
+            if _llm_with_tools is None:
+                # Bind tools to the LLM. The order might influence preference, but descriptions are key.
+                _llm_with_tools = llm.bind_tools(agent_tools)
+    return _llm_with_tools
+
+TOOL_NAMES = {t.name for t in agent_tools}
 
 # Define the State
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
+    deadline: Optional[float] # Absolute time.time() by which the turn must finish (None = no budget)
+    degraded: Optional[str] # Why the turn was cut short, if it was
     # You could add more state here if needed, e.g., conversation_id, user_info
 
+FINAL_ANSWER_NOTE = (
+    "The time budget for this request is almost used up. Do not call any tools. "
+    "Answer now using only the information already gathered in this conversation, "
+    "and briefly mention if the answer may be incomplete."
+)
+TIMEOUT_ANSWER = "I'm sorry, I ran out of time while researching this. Please try again or narrow the question."
+
+def _time_left(state: AgentState) -> Optional[float]:
+    # The current request's deadline wins over the one in the state, which may come
+    # from a checkpoint written by an earlier request (resumed or replayed runs)
+    return remaining(current_deadline() or state.get("deadline"))
+
+def _is_low_on_time(state: AgentState) -> bool:
+    left = _time_left(state)
+    return left is not None and left < settings.agent_deadline_reserve_seconds
+
+def _llm_kwargs(state: AgentState) -> Dict[str, Any]:
+    """Per-call request timeout so a single LLM call can't run past the deadline."""
+    left = _time_left(state)
+    return {} if left is None else {"timeout": max(1.0, left)}
+
+def answer_without_tools(state: AgentState, reason: str) -> Dict[str, Any]:
+    """
+    Produces the final answer from the evidence gathered so far, without binding
+    tools. Drops a trailing AIMessage whose tool calls will not be executed, since
+    the API rejects tool calls that have no tool results.
+    """
+    messages = list(state['messages'])
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+        messages = messages[:-1]
+    messages.append(SystemMessage(content=FINAL_ANSWER_NOTE))
+    logger.info("Deadline near, answering without tools (reason=%s)", reason)
+    increment("agent_degraded_total", "Agent turns answered early because of the deadline", reason=reason)
+    with span("llm.call", **{"llm.messages": len(messages), "llm.degraded": True}) as llm_span:
+        response: AIMessage = get_llm().invoke(messages, **_llm_kwargs(state))
+        record_llm_usage(response, llm_span)
+    response.tool_calls = []
+    if not str(response.content).strip():
+        response.content = TIMEOUT_ANSWER
+    return {"messages": [response], "degraded": reason}
+
 # Define Nodes
 
 # 1. Agent Node: Calls the LLM
 def call_model(state: AgentState):
     """
-    Invokes the LLM, parses potential XML tool calls, and decides next step.
+    Invokes the LLM, parses tool calls written into its text, and decides next step.
     """
-    print(f"--- Calling LLM ---")
     messages = state['messages']
-    response: AIMessage = llm_with_tools.invoke(messages) # Still invoke with bound tools
-
-    print(f"--- Raw LLM Response Object ---")
-    print(response) # Keep for debugging
-    print(f"--- End Raw Response ---")
-
-    # Attempt to parse XML tool call from content
-    parsed_tool_info =  parse_tool_call_from_content(response.content)
-
-    if parsed_tool_info:
-        tool_name, tool_input = parsed_tool_info
-        print(f"--- Parsed XML Tool Call: Name='{tool_name}', Input={tool_input} ---")
-
-        # Instead of just returning the message, we create an AgentAction
-        # This action needs to be stored in the state so the ToolNode can find it.
-        # We need to adjust the state and ToolNode interaction.
-
-        # *** Simplification for now: Let's bypass standard ToolNode routing ***
-        # *** We will call the tool DIRECTLY based on parsed info ***
-        # *** This requires modifying the graph structure significantly ***
-
-        # === Let's try a different approach: Modify the AIMessage ===
-        # Attempt to manually add the tool_calls attribute based on parsing
-        # Note: This might feel hacky but could work with minimal graph changes
-
-        from langchain_core.utils.function_calling import convert_to_openai_tool
-        import uuid
-
-        # Find the tool schema (assuming agent_tools is accessible here)
-        tool_schema = None
-        for t in agent_tools:
-             if t.name == tool_name:
-                 # Convert Langchain Tool to the format expected by AIMessage.tool_calls
-                 # This format often mimics OpenAI's tool structure
-                 tool_schema = convert_to_openai_tool(t)
-                 break
-
-        if tool_schema:
-             tool_call_id = f"call_{uuid.uuid4()}"
-             response.tool_calls = [
-                 {
-                     "id": tool_call_id,
-                     "name": tool_name,
-                     "args": tool_input,
-                 }
-             ]
-             # Clear the raw XML content if desired, or keep it? Let's clear it for cleaner logs.
-             # response.content = f"(Tool call detected: {tool_name})"
-             print(f"--- Manually Added tool_calls to AIMessage: {response.tool_calls} ---")
-        else:
-             print(f"--- Warning: Could not find schema for parsed tool name '{tool_name}' ---")
-             # If schema not found, treat as normal message and don't add tool_calls
-             response.tool_calls = [] # Ensure it's empty
-
-    else:
-        # No valid XML tool call found in content
-         print("--- No XML Tool Call found in content ---")
-         # Ensure tool_calls is empty if not explicitly set
-         if not hasattr(response, 'tool_calls'):
-              response.tool_calls = []
-         elif response.tool_calls is None: # Handle case where it might be None
-              response.tool_calls = []
+    if _is_low_on_time(state):
+        return answer_without_tools(state, reason="deadline_before_llm")
+    with span("llm.call", **{"llm.messages": len(messages)}) as llm_span:
+        response: AIMessage = get_llm_with_tools().invoke(messages, **_llm_kwargs(state)) # Still invoke with bound tools
+        record_llm_usage(response, llm_span)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Raw LLM response: %r", response) # Only formatted when DEBUG is on
+
+    # Tool calls to our tools that the model wrote into its text (XML-style, <function=...> or fenced JSON).
+    # Anything else (JSON or markup in the answer itself) leaves the message as it is.
+    parsed_calls = []
+    if isinstance(response.content, str) and not getattr(response, 'tool_calls', None):
+        parsed_calls = parse_tool_calls(response.content, TOOL_NAMES)
+
+    if parsed_calls:
+        # Turn them into structured tool_calls so the ToolNode can run them
+        logger.debug("Parsed tool calls from content: %s", parsed_calls)
+        response.tool_calls = [
+            {"id": f"call_{uuid.uuid4()}", "name": tool_name, "args": tool_input} for tool_name, tool_input in parsed_calls
+        ]
+    elif getattr(response, 'tool_calls', None) is None:
+        # Ensure tool_calls is empty if not explicitly set
+        response.tool_calls = []
 
 
     # Always return the (potentially modified) response message
@@ -106,68 +146,34 @@ def call_model(state: AgentState):
 # Use the prebuilt ToolNode which handles executing tools based on AIMessage.tool_calls
 tool_node = ToolNode(agent_tools)
 
-def parse_tool_call_from_content(ai_message_content: str) -> Optional[Tuple[str, Dict[str, Any]]]:
-    """
-    Parses potential tool call strings (XML-like or function-like) from LLM content.
-    Handles formats like:
-    - '<ToolName>{"arg": "value"}</ToolName>'
-    - '<function=ToolName{"arg": "value"} </function>'
-    Returns (tool_name, tool_input_dict) or None if no valid call found.
-    """
-    content = ai_message_content.strip()
-
-    # Pattern 1: XML style (<ToolName>...</ToolName>)
-    xml_match = re.match(r"<(\w+)>(.*?)</\1>", content, re.DOTALL)
-    if xml_match:
-        tool_name = xml_match.group(1)
-        argument_str = xml_match.group(2).strip()
-        print(f"Parser: Matched XML style for tool '{tool_name}'")
-        try:
-            tool_input_dict = json.loads(argument_str)
-            if not isinstance(tool_input_dict, dict): return None
-            return tool_name, tool_input_dict
-        except json.JSONDecodeError:
-            print(f"Parser Warning: Failed to parse XML content as JSON: {argument_str}")
-            return None # Expecting JSON args
-
-    # Pattern 2: Function style (<function=ToolName{...} </function>)
-    func_match = re.match(r"<function=(\w+)\s*({.*?})\s*</function>", content, re.DOTALL)
-    if func_match:
-        tool_name = func_match.group(1)
-        argument_str = func_match.group(2).strip()
-        print(f"Parser: Matched function style for tool '{tool_name}'")
-        try:
-            tool_input_dict = json.loads(argument_str)
-            if not isinstance(tool_input_dict, dict): return None
-            return tool_name, tool_input_dict
-        except json.JSONDecodeError:
-            print(f"Parser Warning: Failed to parse function content as JSON: {argument_str}")
-            return None # Expecting JSON args
-
-    print(f"Parser: No known tool call pattern matched in content: '{content[:100]}...'")
-    return None # No known pattern matched
 # Define Conditional Edge Logic
 def should_continue(state: AgentState) -> str:
-    """Determines whether to continue (tool calls present) or end."""
+    """Determines whether to continue (tool calls present), answer early (deadline) or end."""
     last_message = state['messages'][-1]
     # Check the potentially manually added tool_calls attribute
     if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        print("--- Decision: Route to Action (Tool Call Detected in AIMessage) ---")
+        if _is_low_on_time(state):
+            return "finalize" # Not enough budget left for another tool round plus an answer
         return "continue"
     else:
-        print("--- Decision: End (No Tool Call Detected in AIMessage) ---")
         return "end"
 
+# 3. Finalize Node: answers with the evidence so far when the deadline is near
+def finalize(state: AgentState):
+    return answer_without_tools(state, reason="deadline_before_tools")
+
 # --- Build the Graph (No change needed here) ---
 workflow = StateGraph(AgentState)
 workflow.add_node("agent", call_model)
 workflow.add_node("action", tool_node)
+workflow.add_node("finalize", finalize)
 workflow.set_entry_point("agent")
-workflow.add_conditional_edges("agent", should_continue, {"continue": "action", "end": END})
+workflow.add_conditional_edges("agent", should_continue, {"continue": "action", "finalize": "finalize", "end": END})
 workflow.add_edge("action", "agent")
+workflow.add_edge("finalize", END)
 
 # Compile the graph
-# Use checkpointer=None for now if not setting up persistence here
-compiled_graph = workflow.compile(checkpointer=None)
+# With checkpointing on, the state is saved after every node and each run needs a thread_id (its run id)
+compiled_graph = workflow.compile(checkpointer=checkpointer if settings.checkpointing_enabled else None)
 
 # You might want to add error handling wrappers around nodes or edges later
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Speculative knowledge-base prefetch.
+
+On the agent route the first LLM call often just decides to call
+InternalKnowledgeSearch with a query close to the user message. When enabled,
+the retrieval for the user message starts alongside that first call, and a
+matching tool call is answered from the prefetched result instead of searching
+again. The prefetch for the current turn lives in a context variable (copied
+into the threads that run tools, like the request deadline).
+
+Every turn records one outcome in `rag_prefetch_total{outcome}`:
+  hit       a tool call matched and was served from the prefetch
+  mismatch  the knowledge base was searched with a different query
+  unused    the turn finished without searching the knowledge base
+  late      a tool call matched but the prefetch did not finish in time
+  busy      no knowledge-base slot was free, so nothing was prefetched
+Retrieval time spent on prefetches that were not served goes to
+`rag_prefetch_wasted_seconds_total`.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from app.core.admission import tool_slot
+from app.core.config import settings
+from app.core.deadline import clamp_timeout
+from app.core.telemetry import increment, observe
+from app.rag.retriever import retrieve_context
+
+logger = logging.getLogger(__name__)
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=settings.rag_max_concurrency, thread_name_prefix="rag-prefetch")
+_current: contextvars.ContextVar[Optional["RagPrefetch"]] = contextvars.ContextVar("rag_prefetch", default=None)
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def query_overlap(a: str, b: str) -> float:
+    """Jaccard overlap of the two queries' words (1.0 = same words)."""
+    words_a, words_b = _words(a), _words(b)
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class RagPrefetch:
+    """One speculative retrieval for one agent turn."""
+    def __init__(self, query: str):
+        self.query = query
+        self.seconds = 0.0 # Retrieval time, set when the retrieval finishes
+        self.outcome: Optional[str] = None
+        self.busy = False # Set if no slot was free and nothing was retrieved
+        self._lock = threading.Lock()
+        self._future: Future = _prefetch_pool.submit(contextvars.copy_context().run, self._retrieve)
+
+    def _retrieve(self) -> Optional[str]:
+        # Only use a free slot: a speculative search must not queue ahead of real tool calls
+        with tool_slot("InternalKnowledgeSearch", timeout=0) as acquired:
+            if not acquired:
+                self.busy = True
+                return None
+            started = time.perf_counter()
+            try:
+                return retrieve_context(self.query, k=3)
+            finally:
+                self.seconds = time.perf_counter() - started
+
+    def take(self, query: str) -> Optional[str]:
+        """
+        Returns the prefetched context if `query` matches the prefetched one
+        (waiting for the retrieval to finish if needed), else None. Only the
+        first knowledge-base call of the turn decides the outcome.
+        """
+        with self._lock:
+            if self.outcome is not None:
+                return None
+            if query_overlap(query, self.query) < settings.rag_prefetch_min_overlap:
+                self.outcome = "mismatch"
+                return None
+            self.outcome = "hit"
+        try:
+            result = self._future.result(timeout=clamp_timeout(settings.tool_queue_timeout_seconds))
+        except FutureTimeoutError:
+            result = None
+        except Exception:
+            logger.exception("Knowledge-base prefetch failed")
+            result = None
+        if result is None:
+            with self._lock:
+                self.outcome = "busy" if self.busy else "late"
+        return result
+
+    def finish(self) -> None:
+        """Records the turn's outcome and, for unserved prefetches, the wasted retrieval time."""
+        with self._lock:
+            if self.outcome is None:
+                self.outcome = "unused"
+            outcome = "busy" if self.busy else self.outcome
+        increment("rag_prefetch_total", "Speculative knowledge-base prefetches by outcome", outcome=outcome)
+        if outcome == "hit":
+            observe("rag_prefetch_saved_seconds", "Retrieval time saved by served prefetches", self.seconds)
+        elif outcome != "busy":
+            # The retrieval may still be running: count it once it completes
+            self._future.add_done_callback(lambda _: increment(
+                "rag_prefetch_wasted_seconds_total", "Retrieval time spent on prefetches that were not used", self.seconds
+            ))
+
+
+def start_prefetch(query: str) -> Optional[contextvars.Token]:
+    """Starts a prefetch for the current turn if enabled. Returns a token for end_prefetch."""
+    if not settings.rag_prefetch_enabled:
+        return None
+    return _current.set(RagPrefetch(query))
+
+
+def end_prefetch(token: Optional[contextvars.Token]) -> None:
+    if token is None:
+        return
+    prefetch = _current.get()
+    _current.reset(token)
+    if prefetch is not None:
+        prefetch.finish()
+
+
+def take_prefetched(query: str) -> Optional[str]:
+    """Serves a knowledge-base tool call from the current turn's prefetch, if it matches."""
+    prefetch = _current.get()
+    return prefetch.take(query) if prefetch is not None else None
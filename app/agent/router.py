@@ -0,0 +1,160 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.telemetry import span, increment, observe, set_span_attributes
+from app.rag.vector_store import vector_store
+
+logger = logging.getLogger(__name__)
+
+# Routes, cheapest first
+ROUTE_SMALL_TALK = "small_talk" # Short prompt, little history, no tools bound
+ROUTE_KNOWLEDGE = "knowledge" # Knowledge-base excerpts retrieved up front, one LLM call without tools
+ROUTE_AGENT = "agent" # Full graph: system prompt, full history, tool-bound LLM
+
+_SMALL_TALK_PHRASE = (
+    r"hi|hello|hey|hiya|howdy|yo|greetings|good (?:morning|afternoon|evening|night)"
+    r"|thanks|thank you|thx|ty|cheers|much appreciated|appreciate it"
+    r"|bye|goodbye|see you|see ya|later|take care"
+    r"|ok|okay|cool|great|nice|got it|perfect|awesome|sounds good|no problem"
+    r"|how are you(?: doing)?|how's it going|what's up|who are you|what are you"
+    r"|are you (?:a bot|an ai|human|a robot)"
+)
+# Acknowledgements: small talk on their own, but a reply to the assistant's last message
+# ("ok" to "Want me to search the latest figures?") agrees to what it offered
+_ACKNOWLEDGEMENT_PHRASE = (
+    r"ok|okay|cool|great|nice|got it|perfect|awesome|sounds good|no problem|alright|all right"
+    r"|yes|yeah|yep|yup|sure|please|go ahead|do it|go for it|why not"
+)
+_SMALL_TALK_FILLER = r"there|so much|a lot|again|you|that helps|that helped|for (?:the|your) help|friend|buddy|mate|today"
+# The whole (normalised) message is made of small-talk phrases and filler words
+SMALL_TALK_PATTERN = re.compile(
+    rf"^(?:(?:{_SMALL_TALK_PHRASE})(?:\s+(?:{_SMALL_TALK_FILLER}))*\s*)+$"
+)
+ACKNOWLEDGEMENT_PATTERN = re.compile(rf"^(?:(?:{_ACKNOWLEDGEMENT_PHRASE})(?:\s+(?:{_SMALL_TALK_FILLER}))*\s*)+$")
+# Questions that need current information go to the agent (web search), never to the knowledge path
+FRESH_INFO_PATTERN = re.compile(
+    r"\b(?:today|tonight|yesterday|tomorrow|latest|recent|recently|current|currently|now|news|this (?:week|month|year)"
+    r"|price|stock|weather|score|won|election|20\d\d)\b"
+)
+# Follow-ups that lean on earlier turns can't be matched against the knowledge base on their own
+FOLLOW_UP_PATTERN = re.compile(r"\b(?:he|she|it|they|him|her|them|his|its|their|that|those|this one)\b")
+
+SMALL_TALK_MAX_WORDS = 8
+
+# Labelled small-talk examples for the embedding check (catches phrasings the rules miss)
+SMALL_TALK_EXAMPLES = [
+    "hello, how are you today?",
+    "hey there, nice to meet you",
+    "good morning!",
+    "thank you so much, that was really helpful",
+    "thanks for the help",
+    "great, that answers my question",
+    "bye, talk to you later",
+    "see you tomorrow",
+    "are you a real person?",
+    "what is your name?",
+    "who made you?",
+    "how is your day going?",
+    "you're awesome",
+    "nice, cool",
+]
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    reason: str # "rule", "intent_embedding", "rag_score" or "default"
+    confidence: float = 0.0
+    rag_results: List[Tuple[float, str]] = field(default_factory=list) # Pre-fetched chunks for the knowledge route
+
+
+def _normalise(message: str) -> str:
+    text = re.sub(r"[^\w\s']", " ", message.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class QueryRouter:
+    """
+    Picks the cheapest route that can answer a message. Rules run first; then,
+    if the embedding model is available, the message is embedded once and used
+    both for the labelled small-talk check and for a knowledge-base probe.
+    """
+    def __init__(self, small_talk_examples: List[str]):
+        self.small_talk_examples = small_talk_examples
+        self._example_matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _examples(self) -> np.ndarray:
+        if self._example_matrix is None:
+            with self._lock:
+                if self._example_matrix is None:
+                    self._example_matrix = _unit_rows(vector_store.embed(self.small_talk_examples))
+        return self._example_matrix
+
+    def prepare(self) -> None:
+        """Embeds the labelled examples now instead of on the first routed message."""
+        self._examples()
+
+    def route(self, message: str, has_history: bool = False, replying_to_assistant: bool = False) -> RouteDecision:
+        """Classifies a user message. replying_to_assistant: the last history message is the assistant's."""
+        text = _normalise(message)
+        if replying_to_assistant and ACKNOWLEDGEMENT_PATTERN.match(text):
+            return RouteDecision(ROUTE_AGENT, "rule", 1.0)
+        if not text or SMALL_TALK_PATTERN.match(text):
+            return RouteDecision(ROUTE_SMALL_TALK, "rule", 1.0)
+        if FRESH_INFO_PATTERN.search(text) or (has_history and FOLLOW_UP_PATTERN.search(text)):
+            return RouteDecision(ROUTE_AGENT, "rule", 1.0)
+
+        try:
+            query_embedding = vector_store.embed([message])
+        except Exception as e: # Model unavailable: rules only
+            logger.debug("Router embedding unavailable: %s", e)
+            return RouteDecision(ROUTE_AGENT, "default")
+
+        if len(text.split()) <= SMALL_TALK_MAX_WORDS:
+            similarity = float(np.max(self._examples() @ _unit_rows(query_embedding)[0]))
+            if similarity >= settings.router_small_talk_min_similarity:
+                return RouteDecision(ROUTE_SMALL_TALK, "intent_embedding", similarity)
+
+        results = vector_store.search_embedding(query_embedding, k=3)
+        if results:
+            # IndexFlatL2 returns squared L2; for unit-length embeddings (all-MiniLM-L6-v2) cos = 1 - d/2
+            similarity = 1.0 - results[0][0] / 2.0
+            if similarity >= settings.router_knowledge_min_similarity:
+                return RouteDecision(ROUTE_KNOWLEDGE, "rag_score", similarity, results)
+        return RouteDecision(ROUTE_AGENT, "default")
+
+
+query_router = QueryRouter(SMALL_TALK_EXAMPLES)
+
+
+def route_query(message: str, has_history: bool = False, replying_to_assistant: bool = False) -> RouteDecision:
+    """Routes a message. Never raises: disabled or failed routing means the agent route."""
+    if not settings.router_enabled:
+        return RouteDecision(ROUTE_AGENT, "disabled")
+    with span("agent.route") as route_span:
+        try:
+            decision = query_router.route(message, has_history=has_history, replying_to_assistant=replying_to_assistant)
+        except Exception:
+            logger.exception("Query routing failed; using the agent route")
+            decision = RouteDecision(ROUTE_AGENT, "default")
+        set_span_attributes(route_span, **{"agent.route": decision.route, "agent.route_reason": decision.reason})
+    logger.debug("Routed to %s (reason=%s, confidence=%.2f)", decision.route, decision.reason, decision.confidence)
+    return decision
+
+
+def record_route(decision: RouteDecision, seconds: float) -> None:
+    """Per-route request counts and end-to-end agent latency."""
+    increment("agent_route_total", "Agent turns by route", route=decision.route, reason=decision.reason)
+    observe("agent_route_duration_seconds", "Agent turn latency by route", seconds, route=decision.route)
@@ -0,0 +1,111 @@
+"""
+Parser for tool calls written into the LLM's text content.
+
+Some models (or providers) emit tool calls as text instead of structured
+`tool_calls`. Recognised forms, anywhere in the text and any number of times:
+
+    <ToolName>{"query": "..."}</ToolName>
+    <function=ToolName{"query": "..."}</function>      (also <function=ToolName>{...})
+    ```json
+    {"name": "ToolName", "arguments": {"query": "..."}}
+    ```
+
+Arguments must be a JSON object and may nest. In the fenced form the name may
+be under "name", "tool" or "function", and the arguments under "arguments",
+"parameters", "args" or "tool_input" (a JSON-encoded string is accepted too);
+a fenced object without arguments is ordinary JSON in the answer, not a call.
+Given `tool_names`, calls to any other name are ignored, so an answer that
+shows `{"name": "Alice"}` or `<b>{...}</b>` is left alone.
+
+Most answers contain no call, so parse_tool_calls() first rejects text that
+has neither "<" nor a backtick, or (given `tool_names`) none of the names. The
+text is then scanned once: a precompiled pattern jumps to the next opener and
+the JSON object after it is decoded by the C JSON decoder.
+"""
+import json
+import logging
+import re
+from typing import Any, Collection, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_TOOL_NAME_LENGTH = 64
+
+# One alternation for all openers, so finding the next candidate is a single search
+_OPENER = re.compile(
+    rf"<function=(?P<function>\w{{1,{MAX_TOOL_NAME_LENGTH}}})\s*>?"
+    rf"|<(?P<xml>\w{{1,{MAX_TOOL_NAME_LENGTH}}})>"
+    r"|```[A-Za-z]*" # Any fence language tag; the body still has to be a JSON object
+)
+_WHITESPACE = re.compile(r"\s*")
+_DECODER = json.JSONDecoder()
+
+_CLOSING = {"function": "</function>", "fenced": "```"}
+_FENCED_NAME_KEYS = ("name", "tool", "function")
+_FENCED_ARG_KEYS = ("arguments", "parameters", "args", "tool_input")
+
+
+class ParsedToolCall(NamedTuple):
+    name: str
+    args: Dict[str, Any]
+
+
+def _fenced_call(decoded: Dict[str, Any]) -> Optional[ParsedToolCall]:
+    name = next((decoded[key] for key in _FENCED_NAME_KEYS if isinstance(decoded.get(key), str)), None)
+    if not name:
+        return None
+    args = next((decoded[key] for key in _FENCED_ARG_KEYS if key in decoded), None)
+    if isinstance(args, str): # OpenAI-style JSON-encoded arguments
+        try:
+            args = json.loads(args)
+        except ValueError:
+            return None
+    if not isinstance(args, dict):
+        return None
+    return ParsedToolCall(name, args)
+
+
+def parse_tool_calls(content: str, tool_names: Optional[Collection[str]] = None) -> List[ParsedToolCall]:
+    """Parses all complete tool calls in a finished piece of text, keeping only `tool_names` if given."""
+    # Fast path: every opener needs "<" or a backtick, and every call its tool's name.
+    # Single characters are found with memchr; searching for "```" costs as much as the scan.
+    if "<" not in content and "`" not in content:
+        return []
+    if tool_names is not None and not any(name in content for name in tool_names):
+        return []
+
+    calls: List[ParsedToolCall] = []
+    pos = 0
+    while True:
+        match = _OPENER.search(content, pos)
+        if match is None:
+            return calls
+        pos = match.end()
+        start = _WHITESPACE.match(content, pos).end()
+        if not content.startswith("{", start):
+            continue
+        try:
+            decoded, end = _DECODER.raw_decode(content, start)
+        except ValueError:
+            continue # Not JSON (or cut off): openers inside it may still start real calls
+        kind = "function" if match.group("function") else "xml" if match.group("xml") else "fenced"
+        name = match.group(kind) if kind != "fenced" else None
+
+        # The closing tag is required for the XML form and optional otherwise, but is
+        # always consumed so a closing fence is not mistaken for the next opener
+        closing = f"</{name}>" if kind == "xml" else _CLOSING[kind]
+        close_start = _WHITESPACE.match(content, end).end()
+        if content.startswith(closing, close_start):
+            pos = close_start + len(closing)
+        else:
+            pos = end
+            if kind == "xml":
+                continue
+
+        call = ParsedToolCall(name, decoded) if kind != "fenced" else _fenced_call(decoded)
+        if call is None:
+            continue
+        if tool_names is not None and call.name not in tool_names:
+            logger.debug("Ignoring %s tool call to unknown tool %r", kind, call.name)
+            continue
+        calls.append(call)
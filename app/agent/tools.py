@@ -1,60 +1,75 @@
-from langchain.tools import Tool
+import logging
+from typing import Callable, List, Optional
+from langchain.tools import Tool, StructuredTool
 from duckduckgo_search import DDGS
 import requests
 from bs4 import BeautifulSoup
 from app.rag.retriever import retrieve_context # Import the RAG retriever
+from app.core.config import settings
+from app.core.telemetry import span
+from app.core.admission import tool_slot
+from app.core.deadline import clamp_timeout, remaining
+from app.agent.prefetch import take_prefetched
+from app.jobs.queue import SUCCEEDED, current_turn_jobs, job_queue
+
+logger = logging.getLogger(__name__)
 
 # === Web Search Tool (Keep as is or refine error handling) ===
-def duckduckgo_search(query: str) -> list[str]:
-    """Runs DuckDuckGo search and returns the top 3 links."""
-    print(f"--- Running DuckDuckGo Search for: {query} ---")
+def duckduckgo_search(query: str, max_links: int = 3) -> list[str]:
+    """Runs DuckDuckGo search and returns the top `max_links` links."""
     links = []
-    try:
-        with DDGS() as ddgs:
-            results = ddgs.text(query, max_results=5)
-            links = [r['href'] for r in results if r.get('href')][:3]
-    except Exception as e: print(f"DuckDuckGo search failed: {e}")
-    print(f"--- Found Links: {links} ---"); return links
-
-def fetch_web_content_from_links(links: list[str]) -> str:
-    """Fetches and scrapes content from a list of URLs, with error handling."""
-    print(f"--- Fetching content for links: {links} ---");
+    with span("web.search"):
+        try:
+            with DDGS(timeout=int(clamp_timeout(10, minimum=1))) as ddgs:
+                results = ddgs.text(query, max_results=max_links + 2)
+                links = [r['href'] for r in results if r.get('href')][:max_links]
+        except Exception as e: logger.warning("DuckDuckGo search failed: %s", e)
+    logger.debug("DuckDuckGo returned %d links", len(links)); return links
+
+def fetch_web_content_from_links(links: list[str], progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """Fetches and scrapes content from a list of URLs, with error handling. Calls progress(done, total) per URL."""
     texts = []
     errors = [] # Keep track of errors encountered
 
-    for url in links:
+    for done, url in enumerate(links):
+        if progress is not None and done:
+            progress(done, len(links))
+        left = remaining()
+        if left is not None and left < 1.0:
+            # Out of time budget: keep what we have rather than starting another fetch
+            errors.append(f"Skipped {url} (request time budget exhausted)")
+            continue
         try:
-            print(f"Attempting to scrape: {url}") # Add more logging
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'} # More robust user agent
-            r = requests.get(url, timeout=15, headers=headers, allow_redirects=True) # Increase timeout, allow redirects
-            r.raise_for_status() # Raise HTTP errors
+            with span("web.fetch"):
+                r = requests.get(url, timeout=clamp_timeout(15), headers=headers, allow_redirects=True) # Timeout capped by the request deadline
+                r.raise_for_status() # Raise HTTP errors
 
-            soup = BeautifulSoup(r.text, "html.parser")
-            for script_or_style in soup(["script", "style", "nav", "footer", "aside"]): # Remove more non-content tags
-                script_or_style.decompose()
+            with span("web.parse"):
+                soup = BeautifulSoup(r.text, "html.parser")
+                for script_or_style in soup(["script", "style", "nav", "footer", "aside"]): # Remove more non-content tags
+                    script_or_style.decompose()
 
-            text = soup.get_text(separator=" ", strip=True)
+                text = soup.get_text(separator=" ", strip=True)
             if text: # Only append if text was actually extracted
                 texts.append(text[:3000]) # Maybe allow slightly more text per source
-                print(f"--- Successfully scraped: {url} (Length: {len(texts[-1])}) ---")
+                logger.debug("Scraped %s (%d chars)", url, len(texts[-1]))
             else:
-                print(f"--- No text extracted after parsing: {url} ---")
+                logger.info("No text extracted after parsing %s", url)
                 errors.append(f"Could not extract text content from {url}")
 
         except requests.exceptions.Timeout:
-            print(f"--- Timeout fetching {url} ---")
+            logger.info("Timeout fetching %s", url)
             errors.append(f"Timeout accessing {url}")
         except requests.exceptions.HTTPError as http_err:
-            print(f"--- HTTP error fetching {url}: {http_err} ---")
+            logger.info("HTTP error fetching %s: %s", url, http_err)
             errors.append(f"Failed to access {url} (HTTP {http_err.response.status_code})")
         except requests.exceptions.RequestException as req_err:
-            print(f"--- Request error fetching {url}: {req_err} ---")
+            logger.info("Request error fetching %s: %s", url, req_err)
             errors.append(f"Network error accessing {url}")
-        except Exception as e:
+        except Exception:
             # Catch any other unexpected errors during parsing etc.
-            print(f"--- Error processing {url}: {e} ---")
-            # Optional: Log the full traceback for unexpected errors
-            # print(traceback.format_exc())
+            logger.exception("Error processing %s", url)
             errors.append(f"Error processing content from {url}")
 
     # Combine successfully scraped texts
@@ -65,7 +80,6 @@ def fetch_web_content_from_links(links: list[str]) -> str:
         error_summary = "\nAdditionally, errors were encountered accessing some sources:\n- " + "\n- ".join(errors)
         content += error_summary
 
-    print(f"--- Web Search Combined Content Length: {len(content)} ---")
     return content
 
 def search_and_scrape(query: str) -> str:
@@ -74,10 +88,38 @@ def search_and_scrape(query: str) -> str:
     and scrapes the content from those links. Returns the combined scraped text.
     Use this for current events or information not found in the internal knowledge base.
     """
-    print("--- Executing Web Search Tool ---")
-    links = duckduckgo_search(query)
-    if not links: return "Web search did not return any usable links."
-    return fetch_web_content_from_links(links)
+    if settings.web_search_jobs_enabled:
+        return _search_and_scrape_as_job(query)
+    with tool_slot("WebSearch") as acquired:
+        if not acquired:
+            return "Web search is busy right now. Answer from the information already available."
+        with span("tool.WebSearch"):
+            links = duckduckgo_search(query)
+            if not links: return "Web search did not return any usable links."
+            return fetch_web_content_from_links(links)
+
+def _search_and_scrape_as_job(query: str) -> str:
+    """
+    Runs the search as a "web_search" job in the job workers (broader than the
+    inline search) and polls for it within the request's time budget. A job
+    that is still running is reported with the turn (ChatMessageOutput.pending_jobs)
+    and its result can be fetched from /jobs/{job_id}.
+    """
+    turn = current_turn_jobs()
+    wait_seconds, left = settings.web_search_job_wait_seconds, remaining()
+    if left is not None: # Keep the reserve for writing the answer
+        wait_seconds = max(0.0, min(wait_seconds, left - settings.agent_deadline_reserve_seconds))
+    with span("tool.WebSearch"):
+        job_id = job_queue.enqueue("web_search", {"query": query}, user_id=turn.user_id if turn else None)
+        job = job_queue.wait(job_id, timeout=wait_seconds)
+    if job is None:
+        if turn is not None:
+            turn.pending.append(job_id)
+        return (f"Web research is still running in the background (job {job_id}). Answer from the information "
+                "already available and tell the user the research results will be available shortly.")
+    if job["status"] != SUCCEEDED:
+        return "Web search failed. Answer from the information already available."
+    return job["result"]["content"]
 
 web_search_tool = Tool(
     name="WebSearch", # Shorter name can be helpful
@@ -86,18 +128,26 @@ web_search_tool = Tool(
 )
 
 # === RAG Tool ===
-def rag_search(query: str) -> str:
+def rag_search(query: str, collections: Optional[List[str]] = None) -> str:
     """
-    Searches the internal knowledge base (RAG) for information related to the query.
+    Searches the internal knowledge base (RAG) for information related to the query,
+    optionally only in the named collections (e.g. one team's documents).
     Returns relevant text chunks found.
     """
-    print(f"--- Executing RAG Tool with query: {query} ---")
-    return retrieve_context(query, k=3) # Retrieve top 3 chunks
+    if not collections: # The prefetch searched all collections
+        prefetched = take_prefetched(query) # Started with the turn's first LLM call, if enabled
+        if prefetched is not None:
+            return prefetched
+    with tool_slot("InternalKnowledgeSearch") as acquired:
+        if not acquired:
+            return "The internal knowledge base is busy right now. Answer from the information already available."
+        with span("tool.InternalKnowledgeSearch"):
+            return retrieve_context(query, k=3, collections=collections) # Retrieve top 3 chunks
 
-rag_tool = Tool(
+rag_tool = StructuredTool.from_function(
     name="InternalKnowledgeSearch",
     func=rag_search,
-    description="Searches the internal knowledge base for specific information, documents, or context provided to the system. Use this FIRST for queries about internal procedures, specific datasets, or documented knowledge before trying a general web search."
+    description="Searches the internal knowledge base for specific information, documents, or context provided to the system. Use this FIRST for queries about internal procedures, specific datasets, or documented knowledge before trying a general web search. Optionally pass `collections` (e.g. a team name) to search only those knowledge bases; leave it out to search all of them."
 )
 
 
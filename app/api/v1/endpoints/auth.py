@@ -7,11 +7,20 @@ from app.db import crud, models
 from app.db.database import get_db
 from app.schemas import User, UserCreate, Token
 from app.core import security
+from app.core.hashing_pool import PoolSaturatedError
 from app.core.config import settings
 from app.core.deps import get_current_active_user # Import the dependency function
+from app.core.user_cache import CachedUser
 
 router = APIRouter()
 
+def _hashing_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent login attempts, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Registers a new user."""
@@ -22,7 +31,12 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
             detail="Username already registered",
         )
     # You might add email check here too if email is required/unique
-    created_user = crud.create_user(db=db, user=user)
+    db.close() # Return the connection to the pool while bcrypt runs; the session reconnects on next use
+    try:
+        hashed_password = await security.get_password_hash_async(user.password)
+    except PoolSaturatedError:
+        raise _hashing_busy_exception()
+    created_user = crud.create_user(db=db, user=user, hashed_password=hashed_password)
     return created_user
 
 
@@ -33,7 +47,14 @@ async def login_for_access_token(
 ):
     """Authenticates user and returns JWT token."""
     user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    db.close() # Don't hold a pooled connection while waiting for bcrypt (user stays usable, detached)
+    try:
+        password_ok = user is not None and await security.verify_password_async(
+            form_data.password, user.hashed_password
+        )
+    except PoolSaturatedError:
+        raise _hashing_busy_exception()
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -53,6 +74,6 @@ async def login_for_access_token(
 
 # Optional: Endpoint to test authentication
 @router.get("/users/me", response_model=User)
-async def read_users_me(current_user: models.User = Depends(get_current_active_user)): 
+async def read_users_me(current_user: CachedUser = Depends(get_current_active_user)): 
     """Gets the current logged-in user's information."""
     return current_user
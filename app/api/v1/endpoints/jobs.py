@@ -0,0 +1,95 @@
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import List
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+
+from app.schemas import JobOut
+from app.core.config import settings
+from app.core.deps import get_current_active_user
+from app.core.user_cache import CachedUser
+from app.jobs.queue import job_queue
+# app.rag (numpy, FAISS) is imported by the handlers that need it, keeping `import app.main` light
+
+router = APIRouter()
+
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _get_job_or_404(job_id: str, user_id: int) -> dict:
+    job = job_queue.get(job_id)
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+# The handlers below do blocking file and SQLite work, so they are plain functions (run in the threadpool)
+
+@router.post("/documents", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+def upload_document(
+    file: UploadFile = File(...),
+    collection: str = Form(settings.vector_store_default_collection),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """
+    Uploads a text document to a collection of the internal knowledge base
+    (created if new). Ingestion (splitting and embedding) runs as a job in the
+    job workers; poll /jobs/{id} for progress.
+    """
+    from app.rag.ingestion import SUPPORTED_SUFFIXES
+    from app.rag.vector_store import COLLECTION_NAME_PATTERN
+    if not COLLECTION_NAME_PATTERN.match(collection):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Collection names are 1-64 letters, digits, '_' or '-'",
+        )
+    filename = Path(file.filename or "document.txt").name
+    if Path(filename).suffix.lower() not in SUPPORTED_SUFFIXES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type; expected one of: {', '.join(SUPPORTED_SUFFIXES)}",
+        )
+    upload_dir = Path(settings.upload_dir)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / f"{uuid.uuid4().hex}_{re.sub(r'[^A-Za-z0-9._-]', '_', filename)}"
+
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while chunk := file.file.read(_UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > settings.upload_max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+                out.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    if size == 0:
+        os.remove(path)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
+
+    job_id = job_queue.enqueue(
+        "ingest_document", {"path": str(path), "filename": filename, "collection": collection}, user_id=current_user.id
+    )
+    return job_queue.get(job_id)
+
+
+@router.get("/collections", response_model=List[str], tags=["Jobs"])
+def list_collections(current_user: CachedUser = Depends(get_current_active_user)):
+    """Names of the knowledge-base collections that hold documents."""
+    from app.rag.vector_store import vector_store
+    return vector_store.collection_names()
+
+
+@router.get("/jobs", response_model=List[JobOut], tags=["Jobs"])
+def list_jobs(current_user: CachedUser = Depends(get_current_active_user)):
+    """The user's most recent jobs, newest first."""
+    return job_queue.list_for_user(current_user.id)
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut, tags=["Jobs"])
+def get_job(job_id: str, current_user: CachedUser = Depends(get_current_active_user)):
+    """A job's status, progress and, once finished, its result or error."""
+    return _get_job_or_404(job_id, current_user.id)
@@ -0,0 +1,174 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.telemetry import increment, register_gauge
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Takes one token. Returns 0.0 on success, otherwise seconds until one is available."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def give_back(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+def _too_many_requests(detail: str, retry_after: float, reason: str) -> HTTPException:
+    increment("admission_rejected_total", "Chat requests rejected by admission control", reason=reason)
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AgentAdmission:
+    """
+    Admission control for agent runs in this worker:
+      1. a token bucket per user and a global one (request rate),
+      2. a cap on concurrent runs per user (one user can't fill the queue),
+      3. a cap on concurrent runs per worker, with a bounded wait queue.
+    Anything that doesn't fit is rejected right away with 429 + Retry-After
+    instead of queueing unboundedly, so admitted requests keep their latency.
+    """
+
+    def __init__(self):
+        self._user_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._global_bucket = TokenBucket(settings.rate_limit_global_per_second, settings.rate_limit_global_burst)
+        self._user_active: Dict[int, int] = {}
+        self._slots = asyncio.Semaphore(settings.agent_max_concurrent_runs)
+        self.running = 0
+        self.waiting = 0
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(settings.rate_limit_user_per_minute / 60.0, settings.rate_limit_user_burst)
+            self._user_buckets[user_id] = bucket
+            while len(self._user_buckets) > settings.rate_limit_max_tracked_users:
+                self._user_buckets.popitem(last=False) # Forget the least recently seen user
+        else:
+            self._user_buckets.move_to_end(user_id)
+        return bucket
+
+    def _check_rates(self, user_id: int) -> None:
+        # Only called from the event loop, and never awaits, so no lock is needed
+        user_bucket = self._user_bucket(user_id)
+        wait = user_bucket.try_take()
+        if wait:
+            raise _too_many_requests("Rate limit exceeded, please slow down", wait, "user_rate")
+        wait = self._global_bucket.try_take()
+        if wait:
+            user_bucket.give_back() # Not the user's fault
+            raise _too_many_requests("Server is busy, please retry shortly", wait, "global_rate")
+
+    async def _acquire_slot(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for a run slot. Returns False on timeout.
+        asyncio.wait_for can drop a permit granted just as its timeout fires
+        (fixed in Python 3.12), losing the slot for good. Here the acquire is a
+        task of its own, and a permit it gets after we gave up is handed back.
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            await asyncio.wait((acquire,), timeout=timeout)
+        finally:
+            if not acquire.done(): # Timed out, or the request was cancelled
+                acquire.cancel()
+                acquire.add_done_callback(self._release_late_permit)
+        return acquire.done() and not acquire.cancelled()
+
+    def _release_late_permit(self, acquire: "asyncio.Future[bool]") -> None:
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self, user_id: int) -> AsyncIterator[None]:
+        """Holds an agent run slot for the duration of the block, or raises HTTP 429."""
+        self._check_rates(user_id)
+
+        if self._user_active.get(user_id, 0) >= settings.agent_max_concurrent_runs_per_user:
+            raise _too_many_requests("Too many requests in progress for this user", 1, "user_concurrency")
+        if self._slots.locked() and self.waiting >= settings.agent_max_queued_runs:
+            raise _too_many_requests("Server is at capacity, please retry shortly", 1, "queue_full")
+
+        self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+        try:
+            self.waiting += 1
+            queued_at = time.perf_counter()
+            try:
+                acquired = await self._acquire_slot(settings.agent_queue_timeout_seconds)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                raise _too_many_requests("Server is at capacity, please retry shortly", 1, "queue_timeout")
+            increment("admission_queue_seconds_total", "Time admitted runs spent queued",
+                      time.perf_counter() - queued_at)
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self._slots.release()
+        finally:
+            remaining = self._user_active[user_id] - 1
+            if remaining:
+                self._user_active[user_id] = remaining
+            else:
+                del self._user_active[user_id]
+
+
+agent_admission = AgentAdmission()
+register_gauge("agent_runs_in_flight", "Agent runs currently executing in this worker", lambda: agent_admission.running)
+register_gauge("agent_runs_waiting", "Agent runs queued for a slot in this worker", lambda: agent_admission.waiting)
+
+
+# === Tool concurrency pools ===
+# Tools run in worker threads (ToolNode), so these are thread semaphores.
+
+_tool_slots = {
+    "WebSearch": threading.BoundedSemaphore(settings.web_search_max_concurrency),
+    "InternalKnowledgeSearch": threading.BoundedSemaphore(settings.rag_max_concurrency),
+}
+
+
+@contextmanager
+def tool_slot(tool_name: str, timeout: Optional[float] = None) -> Iterator[bool]:
+    """
+    Waits (bounded) for a slot in the tool's own concurrency pool.
+    Yields True if a slot was acquired, False if the pool stayed full; callers
+    should then return a short "busy" answer instead of doing the work.
+    """
+    slots = _tool_slots[tool_name]
+    acquired = slots.acquire(timeout=settings.tool_queue_timeout_seconds if timeout is None else timeout)
+    if not acquired:
+        increment("tool_pool_rejected_total", "Tool calls rejected because the tool pool was full", tool=tool_name)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            slots.release()
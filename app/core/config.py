@@ -1,6 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional
 
 # Define the base directory of the project
 # This assumes config.py is in app/core/
@@ -15,12 +16,84 @@ class Settings(BaseSettings):
 
     # RAG Settings
     embedding_model_name: str = "all-MiniLM-L6-v2"
+    embedding_backend: str = "torch" # "torch", "torch-int8" or "onnx" (see app/rag/embeddings.py)
+    embedding_onnx_file: Optional[str] = None # e.g. "onnx/model_qint8_avx512_vnni.onnx" for the onnx backend
     vector_store_path: str = str(BASE_DIR / "vector_store_data") # Use absolute path
-    faiss_index_file: str = "faiss_index.bin"
+    faiss_index_file: str = "faiss_index.bin" # Single index from script/load_rag_data.py, served as part of the default collection
     faiss_metadata_file: str = "faiss_metadata.pkl"
+    # Collections and shards (see app/rag/vector_store.py)
+    vector_store_default_collection: str = "default"
+    vector_store_shard_max_vectors: int = 50000 # Ingestion starts a new shard beyond this
+    vector_store_memory_budget_mb: int = 1024 # Loaded shards beyond this are evicted, least recently used first
+    vector_store_search_threads: int = 0 # Fan-out of a search across shards; 0 = one per CPU (1 = sequential)
+    # Admission control for /chat (per worker)
+    rate_limit_user_per_minute: float = 20.0
+    rate_limit_user_burst: int = 5
+    rate_limit_global_per_second: float = 20.0
+    rate_limit_global_burst: int = 40
+    rate_limit_max_tracked_users: int = 10000
+    agent_max_concurrent_runs: int = 8
+    agent_max_concurrent_runs_per_user: int = 2
+    agent_max_queued_runs: int = 16 # Beyond this, requests get an immediate 429
+    agent_queue_timeout_seconds: float = 10.0
+    web_search_max_concurrency: int = 4
+    rag_max_concurrency: int = 8
+    tool_queue_timeout_seconds: float = 5.0
+    # Identical /chat requests (user, conversation, message, Idempotency-Key) share one agent run (per worker)
+    chat_coalescing_enabled: bool = True
+    chat_coalesce_retention_seconds: float = 30.0 # Finished results are replayed to retries with the same Idempotency-Key for this long
+
+    # Per-request time budget for agent runs
+    agent_request_timeout_seconds: float = 45.0 # Whole /chat turn, including time spent queued
+    agent_deadline_reserve_seconds: float = 8.0 # Left for the final answer; no new tool rounds below this
+
+    # Query router in front of the agent graph (see app/agent/router.py)
+    router_enabled: bool = True
+    router_small_talk_min_similarity: float = 0.75 # Cosine to the nearest labelled small-talk example
+    router_knowledge_min_similarity: float = 0.6 # Cosine of the best knowledge-base chunk for the direct RAG path
+    router_fast_path_history_messages: int = 4 # History kept on the small-talk and direct RAG paths
+    # Speculative knowledge-base search alongside the agent's first LLM call (see app/agent/prefetch.py)
+    rag_prefetch_enabled: bool = False
+    rag_prefetch_min_overlap: float = 0.5 # Word overlap (Jaccard) a tool query needs to be served from the prefetch
+
+    # Durable agent runs: graph state is checkpointed after every node (see app/agent/checkpoint.py)
+    checkpointing_enabled: bool = True
+    checkpoint_compress_min_bytes: int = 1024 # Serialized values at least this large are zlib-compressed
+    checkpoint_retention_hours: float = 24.0 # Checkpoints of runs idle for longer are pruned
+
+    # Background jobs: document ingestion and research web searches (see app/jobs/)
+    job_queue_url: str = f"sqlite:///{BASE_DIR / 'job_queue.db'}" # Own SQLite file, shared by API and job workers
+    job_worker_processes: int = 2 # Default for `python -m app.jobs.worker`
+    job_poll_interval_seconds: float = 0.5
+    job_max_attempts: int = 3
+    job_stale_seconds: float = 300.0 # Running jobs without a heartbeat for this long are retried (worker died)
+    upload_dir: str = str(BASE_DIR / "uploads") # Uploaded documents wait here until ingested
+    upload_max_bytes: int = 20 * 1024 * 1024
+    ingestion_batch_size: int = 64 # Chunks per embedding batch (and per progress update)
+    vector_store_reload_check_seconds: float = 5.0 # How often API workers look for an index updated by ingestion
+    web_search_jobs_enabled: bool = False # Run WebSearch as a job in the workers instead of inline
+    web_search_job_wait_seconds: float = 20.0 # How long a turn polls for the job before answering without it
+    web_research_max_links: int = 8 # Pages fetched by a web_search job (the inline tool fetches 3)
+
+    # Observability
+    log_level: str = "WARNING" # Level of the `app` logger; DEBUG includes prompts and raw LLM responses
+    metrics_enabled: bool = True # Prometheus metrics at /metrics (needs prometheus_client)
+    tracing_enabled: bool = True # OpenTelemetry spans (needs opentelemetry-api plus an SDK/exporter)
+
+    # Multi-worker deployments (see gunicorn_conf.py)
+    preload_models: bool = False # Load model + index once in the gunicorn master and share them copy-on-write
+    torch_threads_per_worker: int = 0 # 0 keeps torch's default; set e.g. 1-2 when running many workers
     jwt_secret_key: str = "default_secret_needs_override"
     jwt_algorithm: str = "HS256"
     jwt_access_token_expire_minutes: int = 30
+
+    # Authenticated user cache (per process)
+    user_cache_ttl_seconds: float = 30.0 # Upper bound on how stale a cached user row can be
+    user_cache_max_entries: int = 4096 # Bounds both the token and the user cache
+
+    # Password hashing pool (bcrypt runs off the event loop)
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 32 # Extra logins beyond this get a fast 503
     
     class Config:
         # Load variables from .env file located in the base directory
@@ -0,0 +1,46 @@
+"""
+Per-request time budget.
+
+A deadline is an absolute wall-clock timestamp (time.time()), so it can travel
+inside the graph state as well as in a context variable. The context variable
+is what tools and HTTP fetches read: LangGraph/LangChain copy the context into
+the worker threads that run sync nodes and tools.
+"""
+import contextvars
+import time
+from typing import Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def deadline_after(seconds: float) -> float:
+    """Returns the absolute deadline `seconds` from now."""
+    return time.time() + seconds
+
+
+def set_deadline(deadline: Optional[float]) -> contextvars.Token:
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds left until the given (or current) deadline; None if there is no deadline."""
+    deadline = current_deadline() if deadline is None else deadline
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def clamp_timeout(timeout: float, minimum: float = 0.5) -> float:
+    """Shrinks a per-operation timeout so it does not run past the current deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(minimum, min(timeout, left))
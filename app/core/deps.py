@@ -5,6 +5,8 @@ from jose import JWTError
 from app.db import crud, models
 from app.db.database import get_db
 from app.core import security
+from app.core import user_cache
+from app.core.user_cache import CachedUser
 from app.schemas import TokenData
 
 # Define the scheme: points to the URL where the client gets the token
@@ -13,24 +15,37 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
 async def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> models.User:
-    """Dependency to get the current user from the token."""
+) -> CachedUser:
+    """
+    Dependency to get the current user from the token.
+    Validated tokens and user rows are cached briefly in-process, so a warm
+    request does neither the JWT decode nor the database lookup.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    username = security.verify_token(token)
+    username = user_cache.get_cached_token_subject(token)
     if username is None:
-        raise credentials_exception
+        payload = security.decode_token(token)
+        if payload is None:
+            raise credentials_exception
+        username = payload["sub"]
+        user_cache.cache_token_subject(token, username, payload.get("exp"))
+
+    cached_user = user_cache.get_cached_user(username)
+    if cached_user is not None:
+        return cached_user
+
     user = crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
-    return user
+    return user_cache.cache_user(user)
 
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user)
-) -> models.User:
+    current_user: CachedUser = Depends(get_current_user)
+) -> CachedUser:
     """Dependency to get the current *active* user."""
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from app.core.config import settings
+from app.core.telemetry import increment, register_gauge
+
+T = TypeVar("T")
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the pool's wait queue is full and the job was not accepted."""
+
+
+class BoundedWorkerPool:
+    """
+    A small thread pool for CPU-heavy calls (bcrypt) that would otherwise block
+    the event loop. bcrypt releases the GIL while hashing, so threads give real
+    parallelism here. The queue in front of the workers is bounded: once
+    `max_workers + max_queue` jobs are outstanding, new jobs are rejected
+    immediately instead of piling up behind a login storm.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # Queue metrics
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Runs fn(*args) on the pool and awaits the result without blocking the loop."""
+        with self._lock:
+            saturated = self.queued + self.running >= self.max_workers + self.max_queue
+            if saturated:
+                self.rejected += 1
+            else:
+                self.queued += 1
+        if saturated:
+            increment("password_hash_pool_rejected_total", "Password hashing jobs rejected (queue full)")
+            raise PoolSaturatedError(f"{self.name} pool is saturated")
+        submitted_at = time.perf_counter()
+
+        def job() -> T:
+            started_at = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_seconds += started_at - submitted_at
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_run_seconds += time.perf_counter() - started_at
+
+        return await asyncio.wrap_future(self._executor.submit(job))
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the queue metrics."""
+        with self._lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self.total_wait_seconds / completed * 1000) if completed else 0.0,
+                "avg_run_ms": (self.total_run_seconds / completed * 1000) if completed else 0.0,
+            }
+
+
+# Dedicated pool for password hashing, so logins never compete with other executor work.
+password_hash_pool = BoundedWorkerPool(
+    "password-hash",
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
+register_gauge("password_hash_pool_queued", "Password hashing jobs waiting for a worker", lambda: password_hash_pool.queued)
+register_gauge("password_hash_pool_running", "Password hashing jobs running", lambda: password_hash_pool.running)
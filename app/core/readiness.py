@@ -0,0 +1,147 @@
+import gc
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Subsystems that must be up before the instance should receive chat traffic.
+# The embedding model and the vector store are reported too, but RAG degrades
+# gracefully without them (the tool answers "not available"), so they do not
+# gate readiness.
+REQUIRED_SUBSYSTEMS = ("database", "agent")
+OPTIONAL_SUBSYSTEMS = ("embedding_model", "vector_store")
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessRegistry:
+    """Tracks the warm-up state of each subsystem for the /health/ready endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status: Dict[str, Dict[str, Any]] = {
+            name: {"state": PENDING} for name in REQUIRED_SUBSYSTEMS + OPTIONAL_SUBSYSTEMS
+        }
+
+    def set(self, name: str, state: str, detail: Optional[str] = None, seconds: Optional[float] = None):
+        entry: Dict[str, Any] = {"state": state}
+        if detail:
+            entry["detail"] = detail
+        if seconds is not None:
+            entry["seconds"] = round(seconds, 3)
+        with self._lock:
+            self._status[name] = entry
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(self._status[name]["state"] == READY for name in REQUIRED_SUBSYSTEMS)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._status.items()}
+
+
+readiness = ReadinessRegistry()
+
+
+def _run_step(name: str, step: Callable[[], Optional[str]]) -> bool:
+    """Runs one warm-up step, recording its state and duration. The step may return a detail string."""
+    readiness.set(name, LOADING)
+    started = time.perf_counter()
+    try:
+        detail = step()
+    except Exception as e:
+        readiness.set(name, FAILED, detail=str(e), seconds=time.perf_counter() - started)
+        logger.error("Warm-up of '%s' failed: %s", name, e)
+        return False
+    readiness.set(name, READY, detail=detail, seconds=time.perf_counter() - started)
+    return True
+
+
+def _warm_database() -> None:
+    from app.db import models # noqa: F401 (registers the tables on Base.metadata)
+    from app.db.database import init_db
+    init_db() # Create tables if they don't exist (dev convenience)
+
+
+def _warm_agent() -> None:
+    # Importing the graph pulls in LangGraph/LangChain and the tools; creating the
+    # client here means the first chat request doesn't pay for it.
+    from app.agent import agent_executor # noqa: F401
+    from app.agent.graph import get_llm_with_tools
+    get_llm_with_tools()
+
+
+def _warm_embedding_model() -> str:
+    from app.rag.vector_store import vector_store
+    from app.agent.router import query_router
+    vector_store.ensure_model_loaded()
+    query_router.prepare() # First encode initialises the inference runtime (and embeds the router's examples)
+    return "loaded"
+
+
+def _warm_vector_store() -> str:
+    from app.rag.vector_store import vector_store
+    vector_store.ensure_store_loaded()
+    if not vector_store.shard_count():
+        return "empty (no index found)"
+    return (f"{len(vector_store.collection_names())} collections, {vector_store.shard_count()} shards, "
+            f"{vector_store.loaded_bytes // (1024 * 1024)} MB loaded")
+
+
+def warm_up() -> None:
+    """
+    Loads all heavy resources. Blocking; the app runs it in a background thread
+    at startup so /health answers immediately while models load.
+    """
+    _run_step("database", _warm_database)
+    _run_step("agent", _warm_agent)
+    if _run_step("embedding_model", _warm_embedding_model):
+        _run_step("vector_store", _warm_vector_store)
+    else:
+        readiness.set("vector_store", FAILED, detail="embedding model unavailable")
+    logger.info("Warm-up finished. Ready: %s", readiness.is_ready())
+
+
+def preload_shared_resources() -> None:
+    """
+    Loads the embedding model and the FAISS index in the current process so that
+    forked workers inherit them copy-on-write instead of loading their own copy.
+    Meant to run in the gunicorn master (preload mode), right before forking.
+
+    Deliberately does NOT run inference here: the first encode() starts torch's
+    OpenMP thread pool, which does not survive fork() reliably. It also skips
+    creating the Groq client, whose connection pool must not be shared between
+    processes; only the agent modules are imported.
+    """
+    from app.rag.vector_store import vector_store
+    started = time.perf_counter()
+    try:
+        vector_store.ensure_model_loaded()
+        vector_store.ensure_store_loaded()
+    except RuntimeError as e:
+        # Workers will report the failure through /health/ready
+        logger.error("Preloading the embedding model failed: %s", e)
+    from app.agent import agent_executor # noqa: F401
+    # Move everything allocated so far out of the GC's reach. Otherwise every
+    # worker's first collection writes to these objects' headers and un-shares
+    # the pages they live on.
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded shared resources in %.1fs (%d FAISS shards, %d objects frozen)",
+                time.perf_counter() - started, vector_store.shard_count(), gc.get_freeze_count())
+
+
+def configure_worker_after_fork() -> None:
+    """Per-worker setup after fork (DB pool, torch thread count), see preload_shared_resources."""
+    from app.core.config import settings
+    from app.db.database import engine
+    # The master never checks out a connection today, but a pooled connection
+    # inherited from it would be shared by every worker. Drop the parent's pool
+    # without closing its connections (they belong to the master).
+    engine.dispose(close=False)
+    if settings.torch_threads_per_worker > 0:
+        import torch
+        torch.set_num_threads(settings.torch_threads_per_worker)
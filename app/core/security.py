@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, Dict
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.hashing_pool import password_hash_pool
+from app.core.telemetry import span
 
 # Password Hashing Context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -15,6 +17,16 @@ def get_password_hash(password: str) -> str:
     """Hashes a plain password."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Like verify_password, but runs bcrypt on the password hashing pool."""
+    with span("auth.password_verify"):
+        return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Like get_password_hash, but runs bcrypt on the password hashing pool."""
+    with span("auth.password_hash"):
+        return await password_hash_pool.run(get_password_hash, password)
+
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Creates a JWT access token."""
     if expires_delta:
@@ -26,14 +38,18 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verifies a token and returns the subject (e.g., username) if valid, otherwise None."""
+def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """Verifies a token and returns its payload if valid and it carries a subject, otherwise None."""
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
-        subject: Optional[str] = payload.get("sub")
-        if subject is None:
+        if payload.get("sub") is None:
             return None
         # You could add more checks here, e.g., token type, scope etc.
-        return subject
+        return payload
     except JWTError: # Catches expired tokens, invalid signatures etc.
-        return None
\ No newline at end of file
+        return None
+
+def verify_token(token: str) -> Optional[str]:
+    """Verifies a token and returns the subject (e.g., username) if valid, otherwise None."""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
\ No newline at end of file
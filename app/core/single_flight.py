@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.telemetry import increment, register_gauge
+
+
+class _Flight:
+    __slots__ = ("task", "retain", "expires_at")
+
+    def __init__(self, task: "asyncio.Task", retain: bool):
+        self.task = task
+        self.retain = retain
+        self.expires_at: Optional[float] = None # Set once the task has succeeded
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls in this worker: the first call for a
+    key runs the work, later calls with the same key await the same task.
+    With retain=True, a successful result is kept for `retention_seconds` so
+    late retries get it too; otherwise, and after failures, the key is dropped
+    as soon as the work finishes, so the next call runs it again.
+
+    The work runs as its own task, so it is not cancelled when the caller that
+    started it disconnects while others are still waiting on it. It must not
+    use resources owned by that caller's request (e.g. its DB session).
+    """
+
+    def __init__(self, retention_seconds: float):
+        self.retention_seconds = retention_seconds
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._expiry: Deque[Tuple[float, Hashable, _Flight]] = deque() # In completion order
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _evict_expired(self, now: float) -> None:
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key, flight = self._expiry.popleft()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _finished(self, key: Hashable, flight: _Flight, task: "asyncio.Task") -> None:
+        if task.cancelled() or task.exception() is not None or not flight.retain or self.retention_seconds <= 0:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return
+        flight.expires_at = time.monotonic() + self.retention_seconds
+        self._expiry.append((flight.expires_at, key, flight))
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]], retain: bool = True) -> Any:
+        """Runs `work()` once per key and returns its result to every caller. See the class docstring for `retain`."""
+        # Only called from the event loop, and never awaits before registering, so no lock is needed
+        self._evict_expired(time.monotonic())
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(work()), retain)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finished(key, flight, task))
+        else:
+            increment("chat_coalesced_total", "Chat requests served by an identical in-flight or recent turn",
+                      state="retained" if flight.task.done() else "in_flight")
+        return await asyncio.shield(flight.task)
+
+
+def chat_key(user_id: int, conversation_id: Optional[int], message: str, idempotency_key: Optional[str]) -> Tuple:
+    """
+    Chat turns are identical when user, conversation, message and Idempotency-Key
+    all match. Without a key, sending the same message again may be deliberate:
+    callers should then only join a turn still running in an existing conversation.
+    """
+    return user_id, conversation_id, hashlib.sha256(message.encode("utf-8")).hexdigest(), idempotency_key
+
+
+chat_flights = SingleFlight(settings.chat_coalesce_retention_seconds)
+register_gauge("chat_flights_tracked", "Chat turns in flight or retained for coalescing", lambda: len(chat_flights))
@@ -0,0 +1,187 @@
+"""
+Structured logging, Prometheus metrics and OpenTelemetry-style spans.
+
+`prometheus_client` and `opentelemetry-api` are optional. Without them, spans
+still feed the per-request latency breakdown (Server-Timing header and the
+request summary log line); metrics and trace export are simply skipped.
+With opentelemetry-api installed but no SDK configured, spans are no-ops
+until an exporter is set up (e.g. via `opentelemetry-instrument`).
+"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+try:
+    import prometheus_client
+except ImportError: # Optional dependency
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError: # Optional dependency
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Per-request state. The timings list is shared by reference with every context
+# copied from the request (tool threads included), so spans recorded there land
+# in the same breakdown.
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+_tracer = otel_trace.get_tracer("llm-websearch") if (otel_trace and settings.tracing_enabled) else None
+_metrics_enabled = prometheus_client is not None and settings.metrics_enabled
+_metrics: Dict[str, Any] = {}
+_metrics_lock = threading.Lock() # Creation only: two threads must not register the same metric
+
+
+# === Logging ===
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def configure_logging() -> None:
+    """Configures the `app` logger from settings.log_level. Safe to call more than once."""
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.log_level.upper())
+    if any(getattr(h, "_app_handler", False) for h in app_logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._app_handler = True
+    handler.addFilter(_RequestIdFilter())
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s level=%(levelname)s logger=%(name)s request_id=%(request_id)s %(message)s"
+    ))
+    app_logger.addHandler(handler)
+    app_logger.propagate = False
+
+
+# === Metrics ===
+
+def _metric(kind: str, name: str, description: str, labelnames: Sequence[str] = (), **kwargs):
+    if not _metrics_enabled:
+        return None
+    metric = _metrics.get(name)
+    if metric is None:
+        with _metrics_lock:
+            metric = _metrics.get(name)
+            if metric is None:
+                metric = getattr(prometheus_client, kind)(name, description, labelnames, **kwargs)
+                _metrics[name] = metric
+    return metric
+
+
+def increment(name: str, description: str, amount: float = 1.0, **labels: str) -> None:
+    """Increments a Prometheus counter (created on first use). No-op without prometheus_client."""
+    counter = _metric("Counter", name, description, tuple(labels))
+    if counter is not None:
+        (counter.labels(**labels) if labels else counter).inc(amount)
+
+
+def observe(name: str, description: str, value: float, buckets: Optional[Sequence[float]] = None, **labels: str) -> None:
+    """
+    Records a value in a Prometheus histogram (created on first use). The default
+    buckets are meant for seconds; pass `buckets` for other units. Only the first
+    call's buckets count.
+    """
+    kwargs = {"buckets": buckets} if buckets is not None else {}
+    histogram = _metric("Histogram", name, description, tuple(labels), **kwargs)
+    if histogram is not None:
+        (histogram.labels(**labels) if labels else histogram).observe(value)
+
+
+def register_gauge(name: str, description: str, callback) -> None:
+    """Exposes callback() as a gauge, evaluated at scrape time."""
+    gauge = _metric("Gauge", name, description)
+    if gauge is not None:
+        gauge.set_function(callback)
+
+
+def metrics_payload() -> Optional[Tuple[bytes, str]]:
+    """Returns (body, content type) for the /metrics endpoint, or None if metrics are off."""
+    if not _metrics_enabled:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# === Spans ===
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Times a unit of work. Records `app_span_duration_seconds{span=name}`, adds the
+    duration to the current request's latency breakdown and, when OpenTelemetry
+    is available, emits a trace span with the given attributes. Yields the OTel
+    span (or None) so callers can attach attributes discovered during the work.
+    """
+    started = time.perf_counter()
+    otel_cm = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else nullcontext()
+    with otel_cm as otel_span:
+        try:
+            yield otel_span
+        except BaseException:
+            increment("app_span_errors_total", "Spans that ended with an exception", span=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            observe("app_span_duration_seconds", "Time spent per span", elapsed, span=name)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((name, elapsed))
+
+
+def set_span_attributes(otel_span: Any, **attributes: Any) -> None:
+    if otel_span is not None:
+        for key, value in attributes.items():
+            otel_span.set_attribute(key, value)
+
+
+def record_llm_usage(response: Any, otel_span: Any = None) -> None:
+    """Counts prompt/completion tokens from a LangChain AIMessage, if the provider reported them."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    if prompt_tokens:
+        increment("llm_tokens_total", "LLM tokens by type", prompt_tokens, type="prompt")
+    if completion_tokens:
+        increment("llm_tokens_total", "LLM tokens by type", completion_tokens, type="completion")
+    set_span_attributes(otel_span, **{"llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens})
+
+
+# === Request scope ===
+
+@contextmanager
+def request_scope(request_id: Optional[str] = None) -> Iterator[List[Tuple[str, float]]]:
+    """Opens a per-request scope; yields the list that collects (span, seconds) pairs."""
+    timings: List[Tuple[str, float]] = []
+    id_token = request_id_var.set(request_id or uuid.uuid4().hex[:16])
+    timings_token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(timings_token)
+        request_id_var.reset(id_token)
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Formats the breakdown as a Server-Timing header (durations summed per span name)."""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    return ", ".join(
+        f'{name.replace(".", "-")};dur={total * 1000:.1f};desc="{name} x{count}"'
+        for name, (total, count) in totals.items()
+    )
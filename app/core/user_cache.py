@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Hashable, Any
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    Immutable snapshot of the user columns needed by request handlers.
+    Detached from any SQLAlchemy session, so it is safe to share across requests.
+    """
+    id: int
+    username: str
+    email: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, user) -> "CachedUser":
+        return cls(id=user.id, username=user.username, email=user.email, is_active=bool(user.is_active))
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """Stores a value. `expires_at` (monotonic) can only shorten the default TTL."""
+        if self.max_entries <= 0:
+            return
+        deadline = time.monotonic() + self.ttl_seconds
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False) # Evict least recently used
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# token -> (username, token expiry). Only holds tokens whose signature was already verified.
+token_cache = TTLCache(settings.user_cache_max_entries, settings.user_cache_ttl_seconds)
+# username -> CachedUser
+user_cache = TTLCache(settings.user_cache_max_entries, settings.user_cache_ttl_seconds)
+
+
+def get_cached_token_subject(token: str) -> Optional[str]:
+    """Returns the username for an already-validated token, or None on a miss."""
+    entry = token_cache.get(token)
+    if entry is None:
+        return None
+    username, token_expires_at = entry
+    if token_expires_at is not None and token_expires_at <= time.time():
+        token_cache.pop(token)
+        return None
+    return username
+
+
+def cache_token_subject(token: str, username: str, token_expires_at: Optional[float]) -> None:
+    """Caches a validated token. The entry never outlives the token's own `exp` claim."""
+    monotonic_deadline = None
+    if token_expires_at is not None:
+        monotonic_deadline = time.monotonic() + (token_expires_at - time.time())
+    token_cache.set(token, (username, token_expires_at), expires_at=monotonic_deadline)
+
+
+def get_cached_user(username: str) -> Optional[CachedUser]:
+    return user_cache.get(username)
+
+
+def cache_user(user) -> CachedUser:
+    snapshot = CachedUser.from_model(user)
+    user_cache.set(snapshot.username, snapshot)
+    return snapshot
+
+
+def invalidate_user(username: str) -> None:
+    """
+    Drops the cached snapshot for a user. Call this whenever a user row changes
+    (deactivation, email change, ...). Cached tokens resolve through the username,
+    so they pick up the fresh row on the next request.
+    """
+    user_cache.pop(username)
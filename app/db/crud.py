@@ -1,9 +1,14 @@
+import datetime
+from sqlalchemy import Row, and_, func, or_
 from sqlalchemy.orm import Session
 from app.db import models
 from app.core import security # Import security utils
+from app.core.user_cache import invalidate_user
 from app.schemas import UserCreate # Import UserCreate schema
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING: # LangChain is only imported when history is loaded, keeping `import app.main` fast
+    from langchain_core.messages import BaseMessage
 
 # === User CRUD Functions ===
 
@@ -15,9 +20,13 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     """Gets a user by their username."""
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: UserCreate) -> models.User:
-    """Creates a new user in the database."""
-    hashed_password = security.get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    """
+    Creates a new user in the database.
+    Pass `hashed_password` when the caller already hashed it off the event loop.
+    """
+    if hashed_password is None:
+        hashed_password = security.get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -28,6 +37,28 @@ def create_user(db: Session, user: UserCreate) -> models.User:
     db.refresh(db_user)
     return db_user
 
+def update_user(db: Session, user: models.User, **changes) -> models.User:
+    """
+    Applies column changes to a user and drops any cached snapshot of them.
+    Always go through this (or set_user_active) when modifying users, otherwise
+    requests may keep seeing the old row until the cache TTL runs out.
+    """
+    old_username = user.username
+    for field, value in changes.items():
+        setattr(user, field, value)
+    db.commit()
+    db.refresh(user)
+    invalidate_user(old_username)
+    invalidate_user(user.username)
+    return user
+
+def set_user_active(db: Session, user_id: int, is_active: bool) -> Optional[models.User]:
+    """Activates or deactivates a user. Deactivation takes effect on the next request."""
+    user = get_user(db, user_id)
+    if user is None:
+        return None
+    return update_user(db, user, is_active=is_active)
+
 # === Updated Conversation/Message CRUD ===
 
 def get_or_create_conversation(db: Session, user_id: int, conversation_id: Optional[int] = None) -> models.Conversation:
@@ -60,7 +91,7 @@ def add_message(db: Session, conversation_id: int, sender: str, text: str) -> mo
     db.refresh(db_message)
     return db_message
 
-def get_messages_for_conversation(db: Session, user_id: int, conversation_id: int, limit: int = 50) -> List[BaseMessage]:
+def get_messages_for_conversation(db: Session, user_id: int, conversation_id: int, limit: int = 50) -> List["BaseMessage"]:
     """
     Gets the last N messages for a specific conversation owned by the user.
     """
@@ -79,6 +110,7 @@ def get_messages_for_conversation(db: Session, user_id: int, conversation_id: in
         .all()
 
     # Convert to LangChain message format
+    from langchain_core.messages import AIMessage, HumanMessage
     langchain_messages = []
     for msg in reversed(db_messages):
         if msg.sender.lower() == 'user':
@@ -89,4 +121,95 @@ def get_messages_for_conversation(db: Session, user_id: int, conversation_id: in
 
 def get_user_conversations(db: Session, user_id: int) -> List[models.Conversation]:
      """Gets all conversations for a user."""
-     return db.query(models.Conversation).filter(models.Conversation.user_id == user_id).order_by(models.Conversation.created_at.desc()).all()
\ No newline at end of file
+     return db.query(models.Conversation).filter(models.Conversation.user_id == user_id).order_by(models.Conversation.created_at.desc()).all()
+
+def get_conversation_page(
+    db: Session, user_id: int, limit: int = 20,
+    before: Optional[Tuple[datetime.datetime, int]] = None, preview_chars: int = 120,
+) -> List[Row]:
+    """
+    One page of a user's conversations, newest first, with their message count,
+    last message time and a preview of the last message, in a single query.
+    `before` is the (created_at, id) of the last conversation of the previous
+    page (keyset pagination: the cost does not grow with the page number).
+    Returns up to `limit` rows with id, created_at, message_count, last_message_at, preview.
+    """
+    Conversation, Message = models.Conversation, models.Message
+    page = db.query(Conversation.id, Conversation.created_at).filter(Conversation.user_id == user_id)
+    if before is not None:
+        created_at, conversation_id = before
+        # (created_at, id) < before, written so the index range starts at `created_at`
+        page = page.filter(
+            Conversation.created_at <= created_at,
+            or_(Conversation.created_at < created_at, Conversation.id < conversation_id),
+        )
+    page = page.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit).subquery()
+
+    # Aggregates only touch the page's conversations, through ix_messages_conversation_timestamp_id
+    preview = db.query(func.substr(Message.text, 1, preview_chars))\
+        .filter(Message.conversation_id == page.c.id)\
+        .order_by(Message.timestamp.desc(), Message.id.desc())\
+        .limit(1)\
+        .correlate(page)\
+        .scalar_subquery()
+    return db.query(
+            page.c.id,
+            page.c.created_at,
+            func.count(Message.id).label("message_count"),
+            func.max(Message.timestamp).label("last_message_at"),
+            preview.label("preview"),
+        )\
+        .select_from(page)\
+        .outerjoin(Message, Message.conversation_id == page.c.id)\
+        .group_by(page.c.id, page.c.created_at)\
+        .order_by(page.c.created_at.desc(), page.c.id.desc())\
+        .all()
+
+# === Agent runs (checkpointed graph turns, see app/agent/checkpoint.py) ===
+
+RESUMABLE_RUN_STATUSES = ("interrupted", "failed")
+
+def create_agent_run(db: Session, run_id: str, conversation_id: int, user_id: int, input_message: str) -> models.AgentRun:
+    run = models.AgentRun(id=run_id, conversation_id=conversation_id, user_id=user_id,
+                          input_message=input_message, status="running")
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+def get_agent_run(db: Session, user_id: int, run_id: str) -> Optional[models.AgentRun]:
+    """Gets a run owned by the user."""
+    return db.query(models.AgentRun)\
+        .filter(models.AgentRun.id == run_id, models.AgentRun.user_id == user_id)\
+        .first()
+
+def get_conversation_runs(db: Session, user_id: int, conversation_id: int, limit: int = 20) -> List[models.AgentRun]:
+    """Gets the most recent runs of a conversation owned by the user."""
+    return db.query(models.AgentRun)\
+        .filter(models.AgentRun.conversation_id == conversation_id, models.AgentRun.user_id == user_id)\
+        .order_by(models.AgentRun.created_at.desc())\
+        .limit(limit)\
+        .all()
+
+def set_agent_run_status(db: Session, run_id: str, status: str) -> None:
+    db.query(models.AgentRun).filter(models.AgentRun.id == run_id)\
+        .update({"status": status, "updated_at": datetime.datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+def claim_agent_run(db: Session, run_id: str, stale_before: datetime.datetime) -> bool:
+    """
+    Atomically marks a resumable run as running again, so two requests can't
+    resume it at the same time. Runs still marked running count as resumable
+    once they haven't been updated since `stale_before` (their worker died).
+    """
+    claimed = db.query(models.AgentRun)\
+        .filter(
+            models.AgentRun.id == run_id,
+            or_(
+                models.AgentRun.status.in_(RESUMABLE_RUN_STATUSES),
+                and_(models.AgentRun.status == "running", models.AgentRun.updated_at < stale_before),
+            ),
+        )\
+        .update({"status": "running", "updated_at": datetime.datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
@@ -22,4 +22,8 @@ def get_db():
 
 # Function to create database tables (call this once at startup if needed)
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so indexes added to a model later would never be built
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
\ No newline at end of file
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -15,6 +15,11 @@ class Conversation(Base):
 
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination of a user's conversations, newest first (crud.get_conversation_page)
+        Index("ix_conversations_user_created_id", "user_id", "created_at", "id"),
+    )
+
 
 class User(Base): # New User Model
     __tablename__ = "users"
@@ -38,4 +43,64 @@ class Message(Base):
     text = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # History loads, per-conversation counts and the latest message without scanning other conversations
+        Index("ix_messages_conversation_timestamp_id", "conversation_id", "timestamp", "id"),
+    )
+
+class AgentRun(Base):
+    """One agent-graph turn; its LangGraph thread id is the run id."""
+    __tablename__ = "agent_runs"
+
+    id = Column(String(36), primary_key=True) # uuid4 hex string
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    input_message = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default="running") # running, completed, interrupted, failed
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+# === LangGraph checkpoints (see app/agent/checkpoint.py) ===
+
+class GraphCheckpoint(Base):
+    __tablename__ = "graph_checkpoints"
+
+    thread_id = Column(String(64), primary_key=True)
+    checkpoint_ns = Column(String(255), primary_key=True, default="")
+    checkpoint_id = Column(String(64), primary_key=True) # Monotonic, so it also orders checkpoints
+    parent_checkpoint_id = Column(String(64), nullable=True)
+    type = Column(String(32), nullable=False)
+    checkpoint = Column(LargeBinary, nullable=False) # Checkpoint without channel values
+    metadata_type = Column(String(32), nullable=False)
+    metadata_ = Column("metadata", LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class GraphCheckpointBlob(Base):
+    """Channel values, stored once per channel version and shared by the checkpoints that reference it."""
+    __tablename__ = "graph_checkpoint_blobs"
+
+    thread_id = Column(String(64), primary_key=True)
+    checkpoint_ns = Column(String(255), primary_key=True, default="")
+    channel = Column(String(255), primary_key=True)
+    version = Column(String(64), primary_key=True)
+    type = Column(String(32), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class GraphCheckpointWrite(Base):
+    """Outputs (or errors) of tasks that finished in a step, so a resumed step doesn't re-run them."""
+    __tablename__ = "graph_checkpoint_writes"
+
+    thread_id = Column(String(64), primary_key=True)
+    checkpoint_ns = Column(String(255), primary_key=True, default="")
+    checkpoint_id = Column(String(64), primary_key=True)
+    task_id = Column(String(64), primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String(255), nullable=False)
+    type = Column(String(32), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    task_path = Column(String(255), nullable=False, default="")
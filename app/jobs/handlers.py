@@ -0,0 +1,57 @@
+"""
+Job handlers, run by the job workers (app/jobs/worker.py).
+
+Each handler takes the job's payload, a progress(fraction, message) callback
+and the job id, and returns a JSON-serialisable result. Exceptions fail the
+attempt. A job can run again after a failed or lost attempt, so handlers must
+be safe to repeat.
+"""
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[float, Optional[str]], None]
+
+
+def ingest_document(payload: Dict[str, Any], progress: Progress, job_id: str) -> Dict[str, Any]:
+    """
+    Adds an uploaded document to a knowledge-base collection. The uploaded copy is deleted once ingested.
+    Appends are recorded under the job id, so a retry only stores what earlier attempts didn't.
+    """
+    from app.rag.ingestion import applied_chunks, ingest_text
+    path = Path(payload["path"])
+    if not path.exists():
+        # An earlier attempt finished ingesting (and deleted the file) but could not record it
+        stored = applied_chunks(payload.get("collection"), job_id)
+        if stored:
+            return {"filename": payload.get("filename"), "chunks": stored, "collection": payload.get("collection")}
+    text = path.read_text(encoding="utf-8", errors="replace")
+    progress(0.01, f"Loaded {len(text)} characters")
+    result = ingest_text(text, progress, collection=payload.get("collection"), append_id=job_id,
+                         chunk_size=payload.get("chunk_size", 1000), chunk_overlap=payload.get("chunk_overlap", 150))
+    path.unlink(missing_ok=True)
+    logger.info("Ingested %s: %d chunks", payload.get("filename"), result["chunks"])
+    return {"filename": payload.get("filename"), **result}
+
+
+def web_search(payload: Dict[str, Any], progress: Progress, job_id: str) -> Dict[str, Any]:
+    """Research-style web search: more links than the inline WebSearch tool, fetched outside the API workers."""
+    from app.agent.tools import duckduckgo_search, fetch_web_content_from_links
+    links = duckduckgo_search(payload["query"], max_links=settings.web_research_max_links)
+    if not links:
+        return {"content": "Web search did not return any usable links.", "links": []}
+    progress(0.1, f"Found {len(links)} links")
+    content = fetch_web_content_from_links(
+        links, progress=lambda done, total: progress(0.1 + 0.9 * done / total, f"Fetched {done}/{total} pages"),
+    )
+    return {"content": content, "links": links}
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any], Progress, str], Dict[str, Any]]] = {
+    "ingest_document": ingest_document,
+    "web_search": web_search,
+}
@@ -0,0 +1,243 @@
+"""
+Durable job queue backed by its own SQLite database (job_queue_url).
+
+API workers enqueue jobs and read their status; `python -m app.jobs.worker`
+processes claim and run them (see app/jobs/handlers.py). A job is claimed with
+a single UPDATE ... RETURNING, so two workers never get the same job. Workers
+send a heartbeat on a timer while a job runs (progress reports count too):
+running jobs whose heartbeat is older than job_stale_seconds (their worker
+died) are queued again, or failed once they have used job_max_attempts.
+Every later update of a running job names the worker that claimed it, so a
+worker whose job was taken away ("lost claim") can no longer change it.
+"""
+import contextvars
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import (
+    Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, case, create_engine, event, select, update,
+)
+
+from app.core.config import settings
+from app.core.telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+_metadata = MetaData()
+jobs = Table(
+    "jobs", _metadata,
+    Column("id", String(32), primary_key=True),
+    Column("kind", String(50), nullable=False),
+    Column("user_id", Integer, nullable=True),
+    Column("status", String(20), nullable=False, default=QUEUED),
+    Column("payload", Text, nullable=False),
+    Column("result", Text, nullable=True),
+    Column("error", Text, nullable=True),
+    Column("progress", Float, nullable=False, default=0.0), # 0.0 to 1.0
+    Column("progress_message", String(255), nullable=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False),
+    Column("worker", String(64), nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("started_at", DateTime, nullable=True),
+    Column("heartbeat_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_jobs_status_kind_created", "status", "kind", "created_at"), # Claiming the oldest queued job
+    Index("ix_jobs_user_created", "user_id", "created_at"),
+)
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    job = dict(row._mapping)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    """Job queue operations. The engine and table are created on first use."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self):
+        engine = create_engine(self.url, connect_args={"timeout": 30} if self.url.startswith("sqlite") else {})
+        if engine.dialect.name == "sqlite":
+            @event.listens_for(engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, _):
+                # WAL lets API workers read status while a worker process writes progress
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+        _metadata.create_all(engine)
+        return engine
+
+    def dispose(self) -> None:
+        """Drops pooled connections (call in a child process after fork)."""
+        if self._engine is not None:
+            self._engine.dispose(close=False)
+
+    # === API side ===
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], user_id: Optional[int] = None,
+                max_attempts: Optional[int] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as connection:
+            connection.execute(jobs.insert().values(
+                id=job_id, kind=kind, user_id=user_id, status=QUEUED, payload=json.dumps(payload),
+                progress=0.0, attempts=0, max_attempts=max_attempts or settings.job_max_attempts,
+                created_at=datetime.datetime.utcnow(),
+            ))
+        increment("jobs_enqueued_total", "Background jobs enqueued", kind=kind)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            row = connection.execute(select(jobs).where(jobs.c.id == job_id)).first()
+        return _row_to_dict(row) if row is not None else None
+
+    def list_for_user(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(jobs).where(jobs.c.user_id == user_id).order_by(jobs.c.created_at.desc()).limit(limit)
+            ).all()
+        return [_row_to_dict(row) for row in rows]
+
+    def wait(self, job_id: str, timeout: float, poll_seconds: float = 0.2) -> Optional[Dict[str, Any]]:
+        """Polls until the job has finished or `timeout` passes. Returns the job, or None if still unfinished."""
+        give_up_at = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is not None and job["status"] in FINISHED_STATUSES:
+                return job
+            if time.monotonic() + poll_seconds > give_up_at:
+                return None
+            time.sleep(poll_seconds)
+
+    # === Worker side ===
+
+    def claim(self, worker: str, kinds: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """Atomically takes the oldest queued job of the given kinds."""
+        now = datetime.datetime.utcnow()
+        oldest = (
+            select(jobs.c.id)
+            .where(jobs.c.status == QUEUED, jobs.c.kind.in_(kinds))
+            .order_by(jobs.c.created_at)
+            .limit(1)
+            .scalar_subquery()
+        )
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                update(jobs)
+                .where(jobs.c.id == oldest, jobs.c.status == QUEUED)
+                .values(status=RUNNING, worker=worker, attempts=jobs.c.attempts + 1,
+                        started_at=now, heartbeat_at=now, progress=0.0, progress_message=None)
+                .returning(*jobs.c)
+            ).first()
+        return _row_to_dict(row) if row is not None else None
+
+    def _update_claimed(self, job_id: str, worker: str, **values: Any) -> bool:
+        """Updates a running job only if `worker` still holds it. Returns False if the claim was lost."""
+        with self.engine.begin() as connection:
+            changed = connection.execute(
+                update(jobs).where(jobs.c.id == job_id, jobs.c.status == RUNNING, jobs.c.worker == worker).values(**values)
+            ).rowcount
+        return changed == 1
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        return self._update_claimed(job_id, worker, heartbeat_at=datetime.datetime.utcnow())
+
+    def report_progress(self, job_id: str, worker: str, progress: float, message: Optional[str] = None) -> bool:
+        return self._update_claimed(
+            job_id, worker, progress=max(0.0, min(1.0, progress)), progress_message=(message or "")[:255] or None,
+            heartbeat_at=datetime.datetime.utcnow(),
+        )
+
+    def complete(self, job_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        """Marks the job succeeded. Returns False (and changes nothing) if the worker lost its claim."""
+        now = datetime.datetime.utcnow()
+        return self._update_claimed(job_id, worker, status=SUCCEEDED, result=json.dumps(result), error=None,
+                                    progress=1.0, heartbeat_at=now, finished_at=now)
+
+    def _release(self, job_id: str, error: str, *conditions) -> Optional[str]:
+        """
+        Ends a running attempt: the job is queued again while it has attempts left,
+        else failed. Only applies while `conditions` hold. Returns the new status, or None.
+        """
+        retry = jobs.c.attempts < jobs.c.max_attempts
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                update(jobs).where(jobs.c.id == job_id, jobs.c.status == RUNNING, *conditions)
+                .values(status=case((retry, QUEUED), else_=FAILED), error=error[:2000], worker=None,
+                        finished_at=case((retry, None), else_=datetime.datetime.utcnow()))
+                .returning(jobs.c.status)
+            ).first()
+        return row.status if row is not None else None
+
+    def fail(self, job_id: str, worker: str, error: str) -> Optional[str]:
+        """Records a failed attempt. Returns the new status, or None if the worker lost its claim."""
+        return self._release(job_id, error, jobs.c.worker == worker)
+
+    def requeue_stale(self, stale_seconds: float) -> int:
+        """Queues again (or fails) running jobs whose worker stopped sending heartbeats. Returns the count."""
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=stale_seconds)
+        with self.engine.begin() as connection:
+            stale = connection.execute(
+                select(jobs.c.id).where(jobs.c.status == RUNNING, jobs.c.heartbeat_at < stale_before)
+            ).scalars().all()
+        released = 0
+        for job_id in stale:
+            # Re-checked in the UPDATE: a heartbeat since the select means the worker is alive after all
+            if self._release(job_id, "Worker stopped responding", jobs.c.heartbeat_at < stale_before) is not None:
+                logger.warning("Job %s stopped sending heartbeats; released it", job_id)
+                released += 1
+        return released
+
+
+job_queue = JobQueue(settings.job_queue_url)
+
+
+# === Jobs started during a chat turn ===
+# Tools run in worker threads (with a copy of the context), so the turn's
+# owner and the list of jobs it left running travel in a context variable.
+
+class TurnJobs:
+    def __init__(self, user_id: Optional[int]):
+        self.user_id = user_id
+        self.pending: List[str] = [] # Jobs still running when the turn answered
+
+
+_turn_jobs: contextvars.ContextVar[Optional[TurnJobs]] = contextvars.ContextVar("turn_jobs", default=None)
+
+
+@contextmanager
+def turn_jobs(user_id: Optional[int]) -> Iterator[TurnJobs]:
+    token = _turn_jobs.set(TurnJobs(user_id))
+    try:
+        yield _turn_jobs.get()
+    finally:
+        _turn_jobs.reset(token)
+
+
+def current_turn_jobs() -> Optional[TurnJobs]:
+    return _turn_jobs.get()
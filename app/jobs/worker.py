@@ -0,0 +1,119 @@
+"""
+Job worker processes.
+
+    python -m app.jobs.worker [--processes 2] [--kinds ingest_document web_search]
+
+Each process polls the job queue (app/jobs/queue.py), runs one job at a time,
+reports progress and sends heartbeats from a timer thread, so a long step
+without progress reports is not mistaken for a dead worker. Bulk embedding happens here, so the embedding model is
+loaded once per worker process, not per job. SIGINT/SIGTERM stop the workers
+after their current job.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Sequence
+
+from app.core.config import settings
+from app.core.telemetry import configure_logging
+from app.jobs.handlers import HANDLERS
+from app.jobs.queue import FAILED, job_queue
+
+logger = logging.getLogger(__name__)
+
+
+def _send_heartbeats(job_id: str, worker: str, done: threading.Event) -> None:
+    interval = max(1.0, settings.job_stale_seconds / 3)
+    while not done.wait(interval):
+        if not job_queue.heartbeat(job_id, worker):
+            logger.warning("Job %s is no longer claimed by this worker; its result will be discarded", job_id)
+            return
+
+
+def run_job(job: dict, worker: str) -> None:
+    job_id, kind = job["id"], job["kind"]
+    logger.info("Running job %s (%s), attempt %d/%d", job_id, kind, job["attempts"], job["max_attempts"])
+    started = time.perf_counter()
+    done = threading.Event()
+    heartbeats = threading.Thread(target=_send_heartbeats, args=(job_id, worker, done), name=f"heartbeat-{job_id}", daemon=True)
+    heartbeats.start()
+    result, error = None, None
+    try:
+        result = HANDLERS[kind](
+            job["payload"], lambda fraction, message=None: job_queue.report_progress(job_id, worker, fraction, message),
+            job_id,
+        )
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, kind)
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        done.set()
+        heartbeats.join()
+
+    if error is not None:
+        status = job_queue.fail(job_id, worker, error)
+        if status is None:
+            logger.warning("Job %s (%s): lost its claim; failure not recorded", job_id, kind)
+        elif status != FAILED:
+            logger.info("Job %s queued for another attempt", job_id)
+    elif not job_queue.complete(job_id, worker, result):
+        logger.warning("Job %s (%s): lost its claim; result discarded", job_id, kind)
+    else:
+        logger.info("Job %s (%s) succeeded in %.1fs", job_id, kind, time.perf_counter() - started)
+
+
+def run_worker(kinds: Sequence[str], stop) -> None:
+    """Worker loop: claims and runs jobs of `kinds` until `stop` is set."""
+    configure_logging()
+    job_queue.dispose() # Don't share pooled connections with the parent process
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    last_sweep = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_sweep > settings.job_stale_seconds / 2:
+            job_queue.requeue_stale(settings.job_stale_seconds)
+            last_sweep = time.monotonic()
+        job = job_queue.claim(name, kinds)
+        if job is None:
+            stop.wait(settings.job_poll_interval_seconds)
+            continue
+        run_job(job, name)
+
+
+def _ignore_interrupts() -> None:
+    # Children stop through the shared event, so Ctrl+C doesn't kill a job mid-write
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _child_main(kinds: Sequence[str], stop) -> None:
+    _ignore_interrupts()
+    run_worker(kinds, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--processes", type=int, default=settings.job_worker_processes)
+    parser.add_argument("--kinds", nargs="+", default=sorted(HANDLERS), choices=sorted(HANDLERS))
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn") # Each worker loads its own models, no forked state
+    stop = context.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    processes = [context.Process(target=_child_main, args=(args.kinds, stop), name=f"job-worker-{i}")
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    logger.warning("Started %d job workers for %s", len(processes), ", ".join(args.kinds))
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -1,5 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, APIRouter # Added APIRouter
+import base64
+import datetime
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from fastapi import FastAPI, Depends, Header, HTTPException, APIRouter, Query, Request # Added APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 
 # --- Database Imports ---
@@ -7,17 +15,27 @@ from app.db.database import SessionLocal, engine, init_db, get_db
 from app.db import models, crud
 
 # --- Schema Imports ---
-from app.schemas import ChatMessageInput, ChatMessageOutput, User # Added User
+from app.schemas import ChatMessageInput, ChatMessageOutput, User, AgentRunOut, CheckpointOut, ReplayInput, ConversationPage, ConversationSummary # Added User
 
 # --- Agent Imports ---
-from app.agent.agent_executor import run_agent
+# The agent stack (LangGraph, LangChain, Groq client) is imported lazily by the
+# warm-up or the first chat request, so importing this module stays fast.
 
 # --- Auth Imports ---
 from app.core.deps import get_current_active_user # Import dependency
-from app.api.v1.endpoints import auth # Import the auth router
+from app.core.user_cache import CachedUser
+from app.core.admission import agent_admission
+from app.core.single_flight import chat_flights, chat_key
+from app.api.v1.endpoints import auth, jobs # Import the auth and job routers
 
 # --- Config Imports (Optional here) ---
-# from app.core.config import settings
+from app.core.config import settings
+from app.core.deadline import deadline_after
+from app.core.readiness import readiness, warm_up
+from app.core import telemetry
+
+telemetry.configure_logging()
+logger = logging.getLogger(__name__)
 
 # --- Create DB Tables (Manage with migrations later) ---
 # try:
@@ -28,7 +46,19 @@ from app.api.v1.endpoints import auth # Import the auth router
 #     print(f"Error creating database tables: {e}")
 #     # Consider raising error or logging more severely
 
-app = FastAPI(title="LangGraph RAG Agent API")
+# --- Lifespan: start background warm-up, never block startup on model loading ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A daemon thread, not asyncio.to_thread: executor threads are joined at exit,
+    # so a shutdown during warm-up would wait for the model download to finish
+    warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    warm_up_thread.start()
+    logger.info("Startup complete (warm-up continues in background)")
+    yield
+    if warm_up_thread.is_alive():
+        logger.warning("Shutting down while warm-up is still running; not waiting for it")
+
+app = FastAPI(title="LangGraph RAG Agent API", lifespan=lifespan)
 
 # --- CORS Middleware ---
 origins = [
@@ -44,73 +74,213 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Per-request tracing: request id, root span, latency breakdown ---
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with telemetry.request_scope(request.headers.get("X-Request-ID")) as timings:
+        with telemetry.span("http.request", **{"http.method": request.method, "http.path": request.url.path}):
+            response = await call_next(request)
+        response.headers["X-Request-ID"] = telemetry.request_id_var.get()
+        if timings:
+            response.headers["Server-Timing"] = telemetry.server_timing_header(timings)
+            if logger.isEnabledFor(logging.INFO): # Skip building the breakdown string when it won't be logged
+                logger.info("%s %s status=%s breakdown=%s", request.method, request.url.path, response.status_code,
+                            ",".join(f"{name}:{seconds * 1000:.1f}ms" for name, seconds in timings))
+    return response
+
 # --- API Routers ---
 api_router_v1 = APIRouter(prefix="/api/v1")
 
 # Include the authentication router
 api_router_v1.include_router(auth.router, prefix="/auth", tags=["Authentication"])
+api_router_v1.include_router(jobs.router)
 
 # --- Protected Chat Endpoint (Now under /api/v1) ---
 @api_router_v1.post("/chat", response_model=ChatMessageOutput, tags=["Chat"])
 async def chat_endpoint(
     chat_input: ChatMessageInput,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user) # PROTECTED!
+    current_user: CachedUser = Depends(get_current_active_user), # PROTECTED!
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    """Handles chat interactions for the authenticated user."""
+    """
+    Handles chat interactions for the authenticated user. Retries sent with the
+    same Idempotency-Key get the first attempt's result (while it runs, and for
+    chat_coalesce_retention_seconds after) instead of running the turn again.
+    Without a key, only an identical turn still running in the same existing
+    conversation is joined.
+    """
+    from app.agent.agent_executor import run_agent # Cheap once warm-up has imported it
+    # The time budget starts now, so time spent waiting for admission counts against it
+    deadline = deadline_after(settings.agent_request_timeout_seconds)
+    user_id = current_user.id
+
+    async def _turn() -> ChatMessageOutput:
+        # Admission control first: over-limit requests get a fast 429 before any DB or LLM work
+        async with agent_admission.admit(user_id):
+            # Own session: the turn may outlive the request that started it when retries are attached
+            db = SessionLocal()
+            try:
+                # 1. Get or create conversation FOR THE CURRENT USER
+                with telemetry.span("db.get_or_create_conversation"):
+                    conversation = crud.get_or_create_conversation(
+                        db, user_id=user_id, conversation_id=chat_input.conversation_id
+                    )
+                if not conversation:
+                     raise HTTPException(status_code=500, detail="Could not get or create conversation")
+
+                # 2. Run agent logic, passing user_id for context if needed by agent later
+                # Note: run_agent itself doesn't use user_id directly now, but uses it via conversation_id checks in crud
+                # 3. Return its ChatMessageOutput (includes whether the answer was degraded)
+                return await run_agent(
+                    input_message=chat_input.user_message,
+                    conversation_id=conversation.id,
+                    user_id=user_id, # Pass the authenticated user's ID
+                    db=db,
+                    deadline=deadline,
+                )
+
+            except Exception:
+                logger.exception("Error in /chat endpoint")
+                raise HTTPException(status_code=500, detail=f"An internal server error occurred.")
+            finally:
+                db.close()
+
+    if not settings.chat_coalescing_enabled or (idempotency_key is None and chat_input.conversation_id is None):
+        return await _turn() # Two new conversations are never the same turn
+    key = chat_key(user_id, chat_input.conversation_id, chat_input.user_message, idempotency_key)
+    return await chat_flights.run(key, _turn, retain=idempotency_key is not None)
+
+
+# --- Conversation List ---
+def _encode_cursor(created_at: datetime.datetime, conversation_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{conversation_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
     try:
-        # 1. Get or create conversation FOR THE CURRENT USER
-        conversation = crud.get_or_create_conversation(
-            db, user_id=current_user.id, conversation_id=chat_input.conversation_id
-        )
-        if not conversation:
-             raise HTTPException(status_code=500, detail="Could not get or create conversation")
-
-        # 2. Run agent logic, passing user_id for context if needed by agent later
-        # Note: run_agent itself doesn't use user_id directly now, but uses it via conversation_id checks in crud
-        ai_response = await run_agent(
-            input_message=chat_input.user_message,
-            conversation_id=conversation.id,
-            user_id=current_user.id, # Pass the authenticated user's ID
-            db=db
-        )
-
-        # 3. Return response
-        return ChatMessageOutput(
-            ai_response=ai_response,
-            conversation_id=conversation.id
-        )
-
-    except Exception as e:
-        print(f"Error in /chat endpoint: {e}")
-        # import traceback; traceback.print_exc() # Uncomment for detailed trace
-        raise HTTPException(status_code=500, detail=f"An internal server error occurred.")
+        created_at, conversation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@api_router_v1.get("/conversations", response_model=ConversationPage, tags=["Chat"])
+async def list_conversations(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """The user's conversations, newest first, with message count, last message time and a preview."""
+    before = _decode_cursor(cursor) if cursor else None
+    with telemetry.span("db.conversation_page"):
+        # One extra row tells whether there is a next page
+        rows = crud.get_conversation_page(db, user_id=current_user.id, limit=limit + 1, before=before)
+    next_cursor = _encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return ConversationPage(items=[ConversationSummary.model_validate(row) for row in rows[:limit]], next_cursor=next_cursor)
+
+
+# --- Checkpointed Agent Runs ---
+def _get_run_or_404(db: Session, user_id: int, run_id: str) -> models.AgentRun:
+    run = crud.get_agent_run(db, user_id=user_id, run_id=run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+@api_router_v1.get("/runs/{run_id}", response_model=AgentRunOut, tags=["Runs"])
+async def get_run(
+    run_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """A run's status and its checkpoints, oldest first."""
+    from app.agent.agent_executor import list_checkpoints
+    run = _get_run_or_404(db, current_user.id, run_id)
+    out = AgentRunOut.model_validate(run)
+    out.checkpoints = [CheckpointOut(**checkpoint) for checkpoint in await list_checkpoints(run.id)]
+    return out
+
+
+@api_router_v1.get("/conversations/{conversation_id}/runs", response_model=List[AgentRunOut], tags=["Runs"])
+async def get_conversation_runs(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """The conversation's most recent runs (without checkpoints)."""
+    return crud.get_conversation_runs(db, user_id=current_user.id, conversation_id=conversation_id)
+
+
+@api_router_v1.post("/runs/{run_id}/resume", response_model=ChatMessageOutput, tags=["Runs"])
+async def resume_run_endpoint(
+    run_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """Continues an interrupted or failed run from its last checkpoint and saves the answer."""
+    from app.agent.agent_executor import resume_run, RunNotResumableError
+    deadline = deadline_after(settings.agent_request_timeout_seconds)
+    run = _get_run_or_404(db, current_user.id, run_id)
+    async with agent_admission.admit(current_user.id):
+        try:
+            return await resume_run(run, db, deadline=deadline)
+        except RunNotResumableError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception:
+            logger.exception("Error in /runs/resume endpoint")
+            raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@api_router_v1.post("/runs/{run_id}/replay", response_model=ChatMessageOutput, tags=["Runs"])
+async def replay_run_endpoint(
+    run_id: str,
+    replay_input: ReplayInput,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_active_user)
+):
+    """Re-runs a turn from one of its checkpoints for debugging; the conversation is not changed."""
+    from app.agent.agent_executor import replay_run, RunNotResumableError
+    deadline = deadline_after(settings.agent_request_timeout_seconds)
+    run = _get_run_or_404(db, current_user.id, run_id)
+    db.close()
+    async with agent_admission.admit(current_user.id):
+        try:
+            return await replay_run(run, replay_input.checkpoint_id, deadline=deadline)
+        except RunNotResumableError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception:
+            logger.exception("Error in /runs/replay endpoint")
+            raise HTTPException(status_code=500, detail="An internal server error occurred.")
 
 
 # --- Include the main API router in the app ---
 app.include_router(api_router_v1)
 
 
-# --- Health Check (Optional, kept at root) ---
+# --- Health Checks (kept at root) ---
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    """Simple health check endpoint."""
+    """Liveness: the process is up and serving. Never waits on models."""
     return {"status": "ok"}
 
 
-# --- Startup Event (Optional) ---
-@app.on_event("startup")
-async def startup_event():
-    print("Application startup...")
-    # Create tables on startup if they don't exist (dev convenience)
-    try:
-        print("Attempting to create database tables...")
-        models.Base.metadata.create_all(bind=engine)
-        print("Database tables checked/created.")
-    except Exception as e:
-        print(f"Database connection/table creation error: {e}")
-
-    from app.rag.vector_store import vector_store
-    if not vector_store.is_ready(): print("WARNING: RAG vector store not loaded/empty.")
-    else: print("RAG vector store seems ready.")
-    print("Startup complete.")
\ No newline at end of file
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (404 when prometheus_client is missing or metrics are disabled)."""
+    payload = telemetry.metrics_payload()
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = payload
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 200 once the required subsystems are warm, 503 before that."""
+    ready = readiness.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "subsystems": readiness.report()},
+    )
@@ -0,0 +1,91 @@
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+# Supported values for Settings.embedding_backend
+TORCH, TORCH_INT8, ONNX = "torch", "torch-int8", "onnx"
+
+
+class EmbeddingBackend:
+    """
+    Interface for turning text into embedding vectors.
+    Every backend must produce vectors compatible with the index built by the
+    reference (torch) backend for the same model, otherwise search quality drops;
+    `python -m benchmarks.bench_embeddings` checks the cosine agreement.
+    """
+    name = "base"
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """Returns a float32 array of shape (len(texts), dimension)."""
+        raise NotImplementedError
+
+    def get_dimension(self) -> int:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full-precision PyTorch SentenceTransformer (the reference implementation)."""
+    name = TORCH
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer # Heavy import (torch), keep it lazy
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, **self._model_options())
+
+    def _model_options(self) -> dict:
+        return {}
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+        return np.asarray(embeddings, dtype="float32")
+
+    def get_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """
+    PyTorch with dynamic int8 quantization of the Linear layers.
+    Needs nothing beyond torch; typically ~2x faster on CPU for small encoders.
+    """
+    name = TORCH_INT8
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        import torch
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(SentenceTransformerBackend):
+    """
+    ONNX Runtime through sentence-transformers' onnx backend
+    (requires `sentence-transformers>=3.2` and `optimum[onnxruntime]`).
+    Set `embedding_onnx_file` to pick a pre-quantized export shipped with the
+    model, e.g. "onnx/model_qint8_avx512_vnni.onnx"; otherwise the fp32 export is used.
+    """
+    name = ONNX
+
+    def _model_options(self) -> dict:
+        options: dict = {"backend": "onnx"}
+        if settings.embedding_onnx_file:
+            options["model_kwargs"] = {"file_name": settings.embedding_onnx_file}
+        return options
+
+
+_BACKENDS = {
+    TORCH: SentenceTransformerBackend,
+    TORCH_INT8: QuantizedTorchBackend,
+    ONNX: OnnxBackend,
+}
+
+
+def create_embedding_backend(model_name: Optional[str] = None, backend: Optional[str] = None) -> EmbeddingBackend:
+    """Builds the embedding backend selected by the settings (or the given overrides)."""
+    model_name = model_name or settings.embedding_model_name
+    backend = backend or settings.embedding_backend
+    backend_cls = _BACKENDS.get(backend)
+    if backend_cls is None:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(_BACKENDS)}")
+    return backend_cls(model_name)
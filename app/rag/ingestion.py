@@ -0,0 +1,181 @@
+"""
+Adding documents to the FAISS store: split, embed in batches, append.
+
+Runs in job worker processes (app/jobs/handlers.py), never in API workers:
+they only read the store and pick up new or replaced shards (see
+FAISSVectorStore.reload_if_changed). Appends to a collection from several
+processes are serialised with a lock file in its directory. Each shard file is
+written in full and then swapped in with os.replace: the index first, then the
+metadata file, which records how many chunks each append (job) put in the
+shard. That record makes a retried job skip what was already applied, and a
+crash between the two swaps is repaired by the next append.
+"""
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.embeddings import EmbeddingBackend, create_embedding_backend
+from app.rag.vector_store import (
+    COLLECTION_NAME_PATTERN, SHARD_FILE_PATTERN, read_shard_appends, read_shard_metadata, shard_files,
+    write_shard_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = (".txt", ".md")
+
+# Loaded once per worker process
+_embedding_model: Optional[EmbeddingBackend] = None
+
+
+def get_embedding_model() -> EmbeddingBackend:
+    global _embedding_model
+    if _embedding_model is None:
+        logger.info("Loading embedding model: %s (backend: %s)", settings.embedding_model_name, settings.embedding_backend)
+        _embedding_model = create_embedding_backend()
+    return _embedding_model
+
+
+def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 150) -> List[str]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    return [chunk for chunk in splitter.split_text(text) if chunk.strip()]
+
+
+def embed_chunks(chunks: List[str], batch_size: int = 64,
+                 progress: Optional[Callable[[int, int], None]] = None) -> np.ndarray:
+    """Embeds chunks batch by batch, calling progress(done, total) after each batch."""
+    model = get_embedding_model()
+    batches = []
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        batches.append(np.asarray(model.encode(batch, batch_size=batch_size), dtype="float32"))
+        if progress is not None:
+            progress(start + len(batch), len(chunks))
+    return np.vstack(batches)
+
+
+def _temporary(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def _collection_dir(collection: Optional[str]) -> Path:
+    collection = collection or settings.vector_store_default_collection
+    if not COLLECTION_NAME_PATTERN.match(collection):
+        raise ValueError(f"Invalid collection name: {collection!r}")
+    return Path(settings.vector_store_path) / "collections" / collection
+
+
+def _shard_numbers(collection_dir: Path) -> List[int]:
+    if not collection_dir.is_dir():
+        return []
+    return sorted(int(match.group(1)) for match in map(SHARD_FILE_PATTERN.match, os.listdir(collection_dir)) if match)
+
+
+def applied_chunks(collection: Optional[str], append_id: str) -> int:
+    """How many chunks of append `append_id` are already in the collection (reads metadata headers only)."""
+    collection_dir = _collection_dir(collection)
+    total = 0
+    for number in _shard_numbers(collection_dir):
+        metadata_file = shard_files(collection_dir, number)[1]
+        if metadata_file.exists():
+            total += read_shard_appends(metadata_file).get(append_id, 0)
+    return total
+
+
+def _load_shard(index_file: Path, metadata_file: Path, dim: int):
+    import faiss
+    if not (index_file.exists() and metadata_file.exists()):
+        return faiss.IndexFlatL2(dim), [], {}
+    index = faiss.read_index(str(index_file))
+    chunks, appends = read_shard_metadata(metadata_file)
+    if index.ntotal > len(chunks):
+        # An earlier append stopped between replacing the index and the metadata: drop its
+        # vectors (its job never completed, and is retried from what the metadata records)
+        logger.warning("Repairing %s: removing %d vectors without chunks", index_file, index.ntotal - len(chunks))
+        index.remove_ids(np.arange(len(chunks), index.ntotal, dtype="int64"))
+    elif len(chunks) > index.ntotal: # Only written by older versions, which replaced the metadata first
+        logger.warning("Repairing %s: removing %d chunks without vectors", metadata_file, len(chunks) - index.ntotal)
+        del chunks[index.ntotal:]
+    return index, chunks, appends
+
+
+def append_to_store(embeddings: np.ndarray, chunks: List[str], collection: Optional[str] = None,
+                    append_id: Optional[str] = None, first_chunk: int = 0) -> dict:
+    """
+    Appends vectors and their chunks to a collection on disk: to its last shard
+    while it has room (vector_store_shard_max_vectors), then to new shards.
+
+    With `append_id` (the job id), the shards record how many chunks the append
+    wrote, and a retry skips those: `chunks` are the append's chunks from number
+    `first_chunk` on, so a caller that checked applied_chunks() first only
+    needs to embed the rest. Returns the collection, the last shard written
+    (or the last one, if nothing was left to write) and that shard's size.
+    """
+    import faiss
+    from filelock import FileLock
+
+    collection = collection or settings.vector_store_default_collection
+    collection_dir = _collection_dir(collection)
+    collection_dir.mkdir(parents=True, exist_ok=True)
+    shard_capacity = settings.vector_store_shard_max_vectors
+
+    with FileLock(str(collection_dir / ".ingest.lock")):
+        numbers = _shard_numbers(collection_dir)
+        number = numbers[-1] if numbers else 0
+        # Re-checked under the lock: another worker may have run the same job meanwhile
+        start = max(0, applied_chunks(collection, append_id) - first_chunk) if append_id else 0
+        if start:
+            logger.info("Append %s: skipping %d chunks already in %s", append_id, min(start, len(chunks)), collection)
+        index_file, metadata_file = shard_files(collection_dir, number)
+        index, metadata, appends = _load_shard(index_file, metadata_file, embeddings.shape[1])
+        while start < len(chunks):
+            if index.d != embeddings.shape[1]:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match the index ({index.d})")
+            room = shard_capacity - index.ntotal
+            if room <= 0: # Full: start the next shard
+                number += 1
+                index_file, metadata_file = shard_files(collection_dir, number)
+                index, metadata, appends = _load_shard(index_file, metadata_file, embeddings.shape[1])
+                continue
+            end = min(len(chunks), start + room)
+            index.add(embeddings[start:end])
+            metadata.extend(chunks[start:end])
+            if append_id:
+                appends[append_id] = appends.get(append_id, 0) + end - start
+
+            # Both files are written in full first. The metadata goes in last: until it
+            # does, readers and the next append treat the new vectors as absent
+            index_tmp, metadata_tmp = _temporary(index_file), _temporary(metadata_file)
+            faiss.write_index(index, str(index_tmp))
+            write_shard_metadata(str(metadata_tmp), metadata, appends)
+            os.replace(index_tmp, index_file)
+            os.replace(metadata_tmp, metadata_file)
+            logger.info("Appended %d chunks to %s/%s", end - start, collection, index_file.stem)
+            start = end
+        return {"collection": collection, "shard": index_file.stem, "shard_size": index.ntotal}
+
+
+def ingest_text(text: str, progress: Optional[Callable[[float, str], None]] = None, collection: Optional[str] = None,
+                chunk_size: int = 1000, chunk_overlap: int = 150, append_id: Optional[str] = None) -> dict:
+    """
+    Splits, embeds and appends one document to a collection. progress(fraction, message) is called along the way.
+    With `append_id`, a retry only embeds and appends the chunks its earlier attempts did not store.
+    """
+    report = progress or (lambda fraction, message: None)
+    chunks = split_text(text, chunk_size, chunk_overlap)
+    if not chunks:
+        return {"chunks": 0}
+    applied = applied_chunks(collection, append_id) if append_id else 0
+    report(0.05, f"Split into {len(chunks)} chunks" + (f", {applied} already stored" if applied else ""))
+    remaining = chunks[applied:]
+    # Embedding is nearly all of the work: map it to 5-95%
+    embeddings = embed_chunks(
+        remaining, batch_size=settings.ingestion_batch_size,
+        progress=lambda done, total: report(0.05 + 0.9 * done / total, f"Embedded {done}/{total} chunks"),
+    ) if remaining else np.empty((0, get_embedding_model().get_dimension()), dtype="float32")
+    return {"chunks": len(chunks), **append_to_store(embeddings, remaining, collection, append_id, first_chunk=applied)}
@@ -1,15 +1,25 @@
+import logging
 from app.rag.vector_store import vector_store
-from typing import List
+from typing import List, Optional
 
-def retrieve_context(query: str, k: int = 3) -> str:
+logger = logging.getLogger(__name__)
+
+def retrieve_context(query: str, k: int = 3, collections: Optional[List[str]] = None) -> str:
     """
-    Retrieves relevant text chunks from the vector store based on the query.
+    Retrieves relevant text chunks from the vector store based on the query,
+    from the given collections (default: all of them).
     Returns a single string concatenating the results.
     """
+    vector_store.ensure_loaded()
     if not vector_store.is_ready():
         return "Internal knowledge base (RAG) is not available."
 
-    results = vector_store.search(query, k=k)
+    if collections:
+        available = vector_store.collection_names()
+        unknown = [name for name in collections if name not in available]
+        if len(unknown) == len(collections):
+            return f"Unknown knowledge-base collection(s): {', '.join(unknown)}. Available: {', '.join(available)}."
+    results = vector_store.search(query, k=k, collections=collections or None)
 
     if not results:
         return "No relevant information found in the internal knowledge base."
@@ -17,6 +27,5 @@ def retrieve_context(query: str, k: int = 3) -> str:
     # Combine the text chunks into a single context string
     # You might want to add separators or metadata here
     context = "\n---\n".join([chunk for score, chunk in results])
-    print(f"--- RAG Retrieved Context (Top {len(results)} chunks) ---")
-    # print(context) # Optional: print retrieved context for debugging
+    logger.debug("RAG retrieved %d chunks", len(results))
     return context
\ No newline at end of file
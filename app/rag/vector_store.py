@@ -1,88 +1,353 @@
-import faiss
+import contextvars
+import heapq
+import logging
+import os
 import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 from app.core.config import settings
+from app.rag.embeddings import create_embedding_backend
+from app.core.telemetry import increment, register_gauge, span
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+SHARD_FILE_PATTERN = re.compile(r"^shard-(\d{4,})\.index$")
+LEGACY_SHARD = "legacy"
+
+
+def shard_files(collection_dir: Path, number: int) -> Tuple[Path, Path]:
+    """Index and metadata file of a collection's shard number `number`."""
+    return collection_dir / f"shard-{number:04d}.index", collection_dir / f"shard-{number:04d}.pkl"
+
+
+# A shard's metadata file is a small pickled header ({"appends": {append id: chunk count}},
+# see app/rag/ingestion.py) followed by the pickled chunk list, so the header can be
+# read alone. Older files (and the legacy store) hold just the chunk list.
+
+def read_shard_metadata(path: Path) -> Tuple[List[str], Dict[str, int]]:
+    """A shard's chunks and the appends that wrote them."""
+    with open(path, "rb") as f:
+        first = pickle.load(f)
+        if isinstance(first, dict):
+            return pickle.load(f), first["appends"]
+    return first, {}
+
+
+def read_shard_appends(path: Path) -> Dict[str, int]:
+    """The appends recorded in a shard's metadata file, without loading its chunks."""
+    with open(path, "rb") as f:
+        first = pickle.load(f)
+    return first["appends"] if isinstance(first, dict) else {}
+
+
+def write_shard_metadata(path: str, chunks: List[str], appends: Dict[str, int]) -> None:
+    with open(path, "wb") as f:
+        pickle.dump({"appends": appends}, f)
+        pickle.dump(chunks, f)
+
+
+class Shard:
+    """One FAISS index file and its chunks, as found on disk (not necessarily loaded)."""
+    __slots__ = ("collection", "name", "index_file", "metadata_file", "version")
+
+    def __init__(self, collection: str, name: str, index_file: Path, metadata_file: Path):
+        self.collection = collection
+        self.name = name
+        self.index_file = index_file
+        self.metadata_file = metadata_file
+        # Ingestion replaces the index file, then the metadata file: a change to either reloads the shard
+        self.version = (index_file.stat().st_mtime_ns, metadata_file.stat().st_mtime_ns)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.collection, self.name
+
+
+class LoadedShard:
+    __slots__ = ("index", "metadata", "version", "nbytes")
+
+    def __init__(self, index, metadata: List[str], version: Tuple[int, int]):
+        self.index = index
+        self.metadata = metadata
+        self.version = version
+        # Flat index: float32 vectors; plus the chunk texts
+        self.nbytes = index.ntotal * index.d * 4 + sum(len(chunk) for chunk in metadata)
+
 
 class FAISSVectorStore:
+    """
+    Named collections of FAISS shards plus the text chunks they point to.
+
+    On disk, collection `name` is `<vector_store_path>/collections/<name>/shard-NNNN.{index,pkl}`
+    (written by app/rag/ingestion.py). The single index of earlier versions
+    (faiss_index_file / faiss_metadata_file) is served as the "legacy" shard
+    of the default collection.
+
+    Shards are loaded on first search and kept in an LRU cache bounded by
+    vector_store_memory_budget_mb. A search fans out over the selected shards
+    on a thread pool (FAISS releases the GIL) and merges their top k.
+
+    Nothing heavy happens in __init__: the embedding model and the shards are
+    loaded on first use (or by the startup warm-up), so importing this module
+    does not pull in torch or FAISS.
+    """
     def __init__(self):
         self.store_path = Path(settings.vector_store_path)
+        self.collections_path = self.store_path / "collections"
         self.index_file = self.store_path / settings.faiss_index_file
         self.metadata_file = self.store_path / settings.faiss_metadata_file
         self.embedding_model = None
-        self.index = None
-        self.metadata = [] # List to store the actual text chunks corresponding to index positions
+        self.model_error: Optional[str] = None # Set if the model failed to load; not retried
+        self._shards: Dict[str, List[Shard]] = {} # Catalog: collection -> shards on disk
+        self._loaded: "OrderedDict[Tuple[str, str], LoadedShard]" = OrderedDict() # LRU, most recent last
+        self.loaded_bytes = 0
+        self._store_attempted = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def ensure_model_loaded(self):
+        """Loads the embedding model once. Raises RuntimeError if it cannot be loaded."""
+        if self.embedding_model is not None:
+            return
+        with self._lock:
+            if self.embedding_model is None:
+                if self.model_error is not None:
+                    raise RuntimeError(self.model_error)
+                try:
+                    self._load_model()
+                except RuntimeError as e:
+                    self.model_error = str(e)
+                    raise
 
-        self._load_model()
-        self._load_store()
+    def ensure_store_loaded(self):
+        """Reads the shard catalog and loads shards up to the memory budget; later calls only look for changes."""
+        if self._store_attempted:
+            self.reload_if_changed()
+            return
+        with self._lock:
+            if self._store_attempted:
+                return
+            self._shards = self._scan_catalog() or {}
+            self._checked_at = time.monotonic()
+            self._store_attempted = True
+        if not self._shards:
+            logger.warning("No FAISS shards found under %s. Store is empty.", self.store_path)
+        self._warm()
+
+    def ensure_loaded(self) -> bool:
+        """Loads everything needed for search. Returns False if the model failed to load."""
+        try:
+            self.ensure_model_loaded()
+        except RuntimeError:
+            return False
+        self.ensure_store_loaded()
+        return True
 
     def _load_model(self):
-        """Loads the sentence transformer model."""
+        """Loads the embedding model through the configured backend."""
         try:
-            print(f"Loading embedding model: {settings.embedding_model_name}")
-            self.embedding_model = SentenceTransformer(settings.embedding_model_name)
-            print("Embedding model loaded.")
+            logger.info("Loading embedding model: %s (backend: %s)", settings.embedding_model_name, settings.embedding_backend)
+            self.embedding_model = create_embedding_backend()
+            logger.info("Embedding model loaded")
         except Exception as e:
-            print(f"Error loading embedding model: {e}")
+            logger.error("Error loading embedding model: %s", e)
             # Handle error appropriately, maybe raise or exit
             raise RuntimeError(f"Failed to load embedding model: {settings.embedding_model_name}") from e
 
-    def _load_store(self):
-        """Loads the FAISS index and metadata if they exist."""
-        if self.index_file.exists() and self.metadata_file.exists():
-            try:
-                print(f"Loading FAISS index from: {self.index_file}")
-                self.index = faiss.read_index(str(self.index_file))
-                print(f"Loading metadata from: {self.metadata_file}")
-                with open(self.metadata_file, "rb") as f:
-                    self.metadata = pickle.load(f)
-                print(f"FAISS index and metadata loaded. Index size: {self.index.ntotal if self.index else 0}, Metadata size: {len(self.metadata)}")
-            except Exception as e:
-                print(f"Error loading FAISS index or metadata: {e}. Store will be empty.")
-                self.index = None
-                self.metadata = []
-        else:
-            print("FAISS index or metadata file not found. Store is empty.")
-            self.index = None
-            self.metadata = []
+    # === Catalog ===
+
+    def _scan_catalog(self) -> Optional[Dict[str, List[Shard]]]:
+        """Finds the shards on disk (cheap: directory listing and stat calls only). None if listing failed."""
+        catalog: Dict[str, List[Shard]] = {}
+        try:
+            if self.index_file.exists() and self.metadata_file.exists():
+                catalog[settings.vector_store_default_collection] = [
+                    Shard(settings.vector_store_default_collection, LEGACY_SHARD, self.index_file, self.metadata_file)
+                ]
+            if self.collections_path.is_dir():
+                for collection_dir in sorted(self.collections_path.iterdir()):
+                    if not collection_dir.is_dir() or not COLLECTION_NAME_PATTERN.match(collection_dir.name):
+                        continue
+                    for index_file in sorted(collection_dir.iterdir()):
+                        match = SHARD_FILE_PATTERN.match(index_file.name)
+                        if match is None:
+                            continue
+                        index_file, metadata_file = shard_files(collection_dir, int(match.group(1)))
+                        if metadata_file.exists():
+                            catalog.setdefault(collection_dir.name, []).append(
+                                Shard(collection_dir.name, index_file.stem, index_file, metadata_file)
+                            )
+        except OSError as e: # E.g. a file replaced while listing: the next check picks it up
+            logger.warning("Error reading the vector store catalog: %s", e)
+            return None
+        return catalog
+
+    def reload_if_changed(self) -> None:
+        """
+        Picks up shards added or replaced by ingestion jobs (app/rag/ingestion.py).
+        Checks the disk at most every vector_store_reload_check_seconds; changed
+        shards are dropped from the cache and reloaded by the next search.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < settings.vector_store_reload_check_seconds:
+            return
+        self._checked_at = now
+        catalog = self._scan_catalog()
+        if catalog is None:
+            return
+        versions = {shard.key: shard.version for shards in catalog.values() for shard in shards}
+        with self._lock:
+            self._shards = catalog
+            for key in [key for key, loaded in self._loaded.items() if versions.get(key) != loaded.version]:
+                self._unload(key)
+
+    def collection_names(self) -> List[str]:
+        self.ensure_store_loaded()
+        return sorted(self._shards)
+
+    def shard_count(self) -> int:
+        return sum(len(shards) for shards in self._shards.values())
+
+    # === Shard cache ===
+
+    def _unload(self, key: Tuple[str, str]) -> None:
+        # Callers hold self._lock. Searches in flight keep the objects they already hold.
+        loaded = self._loaded.pop(key)
+        self.loaded_bytes -= loaded.nbytes
+
+    def _get_shard(self, shard: Shard) -> LoadedShard:
+        with self._lock:
+            loaded = self._loaded.get(shard.key)
+            if loaded is not None and loaded.version == shard.version:
+                self._loaded.move_to_end(shard.key)
+                return loaded
+        # Read outside the lock so other shards keep serving (a rare duplicate read is harmless)
+        import faiss
+        with span("rag.shard_load"):
+            # Read mid-append, the index may hold vectors the metadata doesn't list yet (or the
+            # other way round); searches skip ids without a chunk, and the next version reloads
+            index = faiss.read_index(str(shard.index_file))
+            metadata, _ = read_shard_metadata(shard.metadata_file)
+        loaded = LoadedShard(index, metadata, shard.version)
+        increment("vector_store_shard_loads_total", "FAISS shards loaded from disk", collection=shard.collection)
+        with self._lock:
+            if shard.key in self._loaded:
+                self._unload(shard.key)
+            self._loaded[shard.key] = loaded
+            self.loaded_bytes += loaded.nbytes
+            self._evict(keep=shard.key)
+        return loaded
+
+    def _evict(self, keep: Tuple[str, str]) -> None:
+        """Unloads least recently used shards until the cache fits the budget. Callers hold self._lock."""
+        budget = settings.vector_store_memory_budget_mb * 1024 * 1024
+        for key in list(self._loaded):
+            if self.loaded_bytes <= budget:
+                return
+            if key != keep:
+                logger.info("Evicting FAISS shard %s/%s (memory budget)", *key)
+                self._unload(key)
+                increment("vector_store_shard_evictions_total", "FAISS shards evicted to stay within the memory budget")
+        if self.loaded_bytes > budget:
+            logger.warning("FAISS shard %s/%s alone exceeds vector_store_memory_budget_mb", *keep)
+
+    def _warm(self) -> None:
+        """Loads shards (default collection first) while they fit in the memory budget."""
+        budget = settings.vector_store_memory_budget_mb * 1024 * 1024
+        default = settings.vector_store_default_collection
+        for collection in sorted(self._shards, key=lambda name: name != default):
+            for shard in self._shards[collection]:
+                if self.loaded_bytes >= budget:
+                    return
+                try:
+                    self._get_shard(shard)
+                except Exception:
+                    logger.exception("Error loading FAISS shard %s/%s", *shard.key)
+
+    # === Search ===
 
     def is_ready(self) -> bool:
         """Checks if the vector store is loaded and ready."""
-        return self.index is not None and self.embedding_model is not None and len(self.metadata) > 0
+        return self.embedding_model is not None and bool(self._shards)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Encodes texts with the store's embedding model (loading it if needed)."""
+        self.ensure_model_loaded()
+        with span("rag.embed"):
+            return self.embedding_model.encode(texts)
 
-    def search(self, query: str, k: int = 3) -> List[Tuple[float, str]]:
-        """Performs a similarity search."""
+    def search(self, query: str, k: int = 3, collections: Optional[Iterable[str]] = None) -> List[Tuple[float, str]]:
+        """Performs a similarity search in `collections` (default: all)."""
+        self.ensure_loaded()
         if not self.is_ready():
-            print("Vector store not ready for search.")
+            logger.debug("Vector store not ready for search")
             return []
+        try:
+            # FAISS expects a 2D float32 array for search, which the backend already returns
+            query_embedding_np = self.embed([query])
+        except Exception:
+            logger.exception("Error embedding query")
+            return []
+        return self.search_embedding(query_embedding_np, k=k, collections=collections)
+
+    def _select_shards(self, collections: Optional[Iterable[str]]) -> List[Shard]:
+        catalog = self._shards
+        names = catalog.keys() if collections is None else [name for name in collections if name in catalog]
+        return [shard for name in names for shard in catalog[name]]
 
+    def _search_shard(self, shard: Shard, query_embedding_np: np.ndarray, k: int) -> List[Tuple[float, str]]:
         try:
-            query_embedding = self.embedding_model.encode([query])[0]
-            # FAISS expects a 2D array for search
-            query_embedding_np = np.array([query_embedding]).astype('float32')
-
-            # Perform the search
-            distances, indices = self.index.search(query_embedding_np, k)
-
-            results = []
-            if indices.size > 0:
-                for i, idx in enumerate(indices[0]):
-                    if 0 <= idx < len(self.metadata): # Ensure index is valid
-                        score = distances[0][i] # FAISS returns L2 distance, lower is better
-                        text_chunk = self.metadata[idx]
-                        results.append((float(score), text_chunk))
-                    else:
-                         print(f"Warning: FAISS returned invalid index {idx}")
-
-            # Sort by score (ascending for L2 distance)
-            results.sort(key=lambda x: x[0])
-            return results
+            loaded = self._get_shard(shard)
+            distances, indices = loaded.index.search(query_embedding_np, k)
+        except Exception:
+            logger.exception("Error during FAISS search in shard %s/%s", *shard.key)
+            return []
+        results = []
+        for score, idx in zip(distances[0], indices[0]):
+            if 0 <= idx < len(loaded.metadata): # Ensure index is valid (-1 pads short results)
+                results.append((float(score), loaded.metadata[idx])) # FAISS returns L2 distance, lower is better
+        return results
 
-        except Exception as e:
-            print(f"Error during FAISS search: {e}")
+    def search_embedding(
+        self, query_embedding_np: np.ndarray, k: int = 3, collections: Optional[Iterable[str]] = None
+    ) -> List[Tuple[float, str]]:
+        """Performs a similarity search for an already encoded query (shape (1, dim)) in `collections` (default: all)."""
+        self.ensure_store_loaded()
+        if not self.is_ready():
             return []
+        shards = self._select_shards(collections)
+        if not shards:
+            return []
+
+        threads = settings.vector_store_search_threads or os.cpu_count() or 1
+        with span("rag.faiss_search", shards=len(shards)):
+            if len(shards) == 1 or threads == 1:
+                # Handing the shards to other threads only adds overhead when they can't run in parallel
+                per_shard = [self._search_shard(shard, query_embedding_np, k) for shard in shards]
+            else:
+                if self._pool is None:
+                    with self._lock:
+                        if self._pool is None:
+                            # At most min(shards, threads) run at once: a search submits one task per shard
+                            self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="faiss-search")
+                # Each task gets its own context copy (request id, deadline) for logging and spans
+                futures = [
+                    self._pool.submit(contextvars.copy_context().run, self._search_shard, shard, query_embedding_np, k)
+                    for shard in shards
+                ]
+                per_shard = [future.result() for future in futures]
+        # Merge the per-shard top k (ascending L2 distance)
+        return heapq.nsmallest(k, (result for results in per_shard for result in results), key=itemgetter(0))
 
-# Single instance for the application
-vector_store = FAISSVectorStore()
\ No newline at end of file
+# Single instance for the application (cheap to construct, loads lazily)
+vector_store = FAISSVectorStore()
+register_gauge("vector_store_loaded_bytes", "Approximate memory held by loaded FAISS shards", lambda: vector_store.loaded_bytes)
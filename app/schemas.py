@@ -1,5 +1,6 @@
+import datetime
 from pydantic import BaseModel, EmailStr # Added EmailStr
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 # === Existing Schemas ===
 class ChatMessageInput(BaseModel):
@@ -9,6 +10,58 @@ class ChatMessageInput(BaseModel):
 class ChatMessageOutput(BaseModel):
     ai_response: str
     conversation_id: int
+    degraded: bool = False # True if the answer was cut short by the request's time budget
+    run_id: Optional[str] = None # Set for agent-graph turns; see /runs/{run_id} to resume or replay
+    pending_jobs: List[str] = [] # Background jobs (e.g. web research) still running; poll /jobs/{job_id}
+
+class CheckpointOut(BaseModel):
+    checkpoint_id: str
+    step: Optional[int] = None
+    source: Optional[str] = None # "input", "loop", "update" or "fork"
+    next: List[str] = [] # Nodes that run next if the run continues from here
+    created_at: Optional[str] = None
+    message_count: int = 0
+
+class AgentRunOut(BaseModel):
+    id: str
+    conversation_id: int
+    status: str # running, completed, interrupted or failed
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    checkpoints: List[CheckpointOut] = []
+
+    class Config:
+        from_attributes = True
+
+class ReplayInput(BaseModel):
+    checkpoint_id: Optional[str] = None # Default: replay the whole turn from its first checkpoint
+
+class ConversationSummary(BaseModel):
+    id: int
+    created_at: datetime.datetime
+    message_count: int
+    last_message_at: Optional[datetime.datetime] = None
+    preview: Optional[str] = None # Start of the last message
+
+    class Config:
+        from_attributes = True
+
+class ConversationPage(BaseModel):
+    items: List[ConversationSummary]
+    next_cursor: Optional[str] = None # Pass as ?cursor= for the next page; None on the last page
+
+class JobOut(BaseModel):
+    id: str
+    kind: str # "ingest_document" or "web_search"
+    status: str # queued, running, succeeded or failed
+    progress: float # 0.0 to 1.0
+    progress_message: Optional[str] = None
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
 
 # === New Auth Schemas ===
 class UserBase(BaseModel):
@@ -0,0 +1,110 @@
+"""
+Overhead of checkpointing the agent graph.
+
+Runs the real agent graph offline (stand-in chat model with no latency that
+always calls WebSearch once, fake search against local fixture pages) with and
+without the database checkpointer, on a temporary SQLite file, and reports:
+  - mean turn time and the added time per checkpoint (one per graph step);
+  - bytes stored per checkpoint (checkpoint row + new channel blobs + task
+    writes), with compression as configured and with compression disabled.
+
+Usage: python -m benchmarks.bench_checkpointing [--turns 50] [--history 10]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.standins import FakeChatGroq, make_fake_search, start_fixture_server
+
+
+def build_graphs(database_path: Path):
+    from app.agent import graph, tools
+    from app.agent.checkpoint import SQLAlchemyCheckpointSaver
+    from app.db import models
+
+    server = start_fixture_server(latency=0.0)
+    tools.duckduckgo_search = make_fake_search(f"http://127.0.0.1:{server.server_port}")
+    graph.set_chat_model(FakeChatGroq(
+        first_token_latency=0.0, tokens_per_second=1e9, tool_call_rate=1.0, tool_names=["WebSearch"], seed=1,
+    ))
+    engine = create_engine(f"sqlite:///{database_path}")
+    models.Base.metadata.create_all(engine)
+    saver = SQLAlchemyCheckpointSaver(engine)
+    return graph.workflow.compile(), graph.workflow.compile(checkpointer=saver), engine
+
+
+def initial_state(history_messages: int):
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    history = []
+    for i in range(history_messages // 2):
+        history += [HumanMessage(content=f"Earlier question {i} about the release schedule?"),
+                    AIMessage(content="An earlier answer with a few sentences of detail. " * 8)]
+    messages = [SystemMessage(content="You are a helpful assistant.")] + history
+    messages.append(HumanMessage(content="What is new in the latest Python release?"))
+    return {"messages": messages, "deadline": time.time() + 60, "degraded": None}
+
+
+async def run_turns(compiled, turns: int, history_messages: int, checkpointed: bool):
+    thread_ids, steps, started = [], 0, time.perf_counter()
+    for _ in range(turns):
+        config = {"recursion_limit": 15}
+        if checkpointed:
+            thread_ids.append(uuid.uuid4().hex)
+            config["configurable"] = {"thread_id": thread_ids[-1]}
+        async for _ in compiled.astream(initial_state(history_messages), config=config, stream_mode="values"):
+            steps += 1
+    return (time.perf_counter() - started) / turns, steps / turns, thread_ids
+
+
+def stored_bytes(engine, thread_ids) -> int:
+    from app.db import models
+    total = 0
+    with engine.connect() as connection:
+        for table, columns in (
+            (models.GraphCheckpoint.__table__, ("checkpoint", "metadata")),
+            (models.GraphCheckpointBlob.__table__, ("data",)),
+            (models.GraphCheckpointWrite.__table__, ("data",)),
+        ):
+            for column in columns:
+                total += connection.execute(
+                    select(func.coalesce(func.sum(func.length(table.c[column])), 0))
+                    .where(table.c.thread_id.in_(thread_ids))
+                ).scalar()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent graph checkpointing.")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--history", type=int, default=10, help="History messages before the question.")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain, checkpointed, engine = build_graphs(Path(tmp) / "checkpoints.db")
+        asyncio.run(run_turns(plain, 3, args.history, False)) # Warm-up
+        asyncio.run(run_turns(checkpointed, 3, args.history, True))
+
+        plain_s, steps, _ = asyncio.run(run_turns(plain, args.turns, args.history, False))
+        checkpointed_s, _, thread_ids = asyncio.run(run_turns(checkpointed, args.turns, args.history, True))
+        compressed = stored_bytes(engine, thread_ids) / (args.turns * steps)
+
+        settings.checkpoint_compress_min_bytes = 1 << 30 # Disable compression
+        _, _, raw_ids = asyncio.run(run_turns(checkpointed, args.turns, args.history, True))
+        raw = stored_bytes(engine, raw_ids) / (args.turns * steps)
+
+    print(f"graph steps (checkpoints) per turn: {steps:.0f}")
+    print(f"turn time without checkpointer {plain_s * 1000:>8.2f} ms")
+    print(f"turn time with checkpointer    {checkpointed_s * 1000:>8.2f} ms "
+          f"(+{(checkpointed_s - plain_s) / steps * 1000:.2f} ms per checkpoint)")
+    print(f"bytes per checkpoint: {compressed:,.0f} compressed, {raw:,.0f} raw")
+
+
+if __name__ == "__main__":
+    main()
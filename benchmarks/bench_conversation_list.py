@@ -0,0 +1,121 @@
+"""
+Conversation listing: keyset page with aggregates vs the lazy-loading listing.
+
+Seeds a temporary SQLite database with one heavy user (--conversations, each
+with --messages messages) plus other users, then times:
+  - the previous approach: crud.get_user_conversations() and reading
+    `conversation.messages` for each (one query per conversation);
+  - crud.get_conversation_page() for the first page and for a deep page
+    (cursor near the end), which should cost about the same;
+and prints SQLite's query plan for the page query.
+
+Usage: python -m benchmarks.bench_conversation_list [--conversations 5000] [--messages 10]
+"""
+import argparse
+import datetime
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+
+
+def seed(session, conversations: int, messages: int, other_users: int) -> int:
+    from app.db import models
+    users = [models.User(username=f"user-{i}", hashed_password="x") for i in range(other_users + 1)]
+    session.add_all(users)
+    session.commit()
+    start = datetime.datetime(2024, 1, 1)
+    conversation_rows, message_rows = [], []
+    next_id = 1
+    for user in users:
+        count = conversations if user is users[0] else max(1, conversations // 10)
+        for i in range(count):
+            created = start + datetime.timedelta(minutes=i)
+            conversation_rows.append({"id": next_id, "user_id": user.id, "created_at": created})
+            for j in range(messages):
+                message_rows.append({
+                    "conversation_id": next_id, "sender": "user" if j % 2 == 0 else "ai",
+                    "text": f"Message {j} of conversation {next_id}. " * 8,
+                    "timestamp": created + datetime.timedelta(seconds=j),
+                })
+            next_id += 1
+    session.execute(insert(models.Conversation.__table__), conversation_rows)
+    session.execute(insert(models.Message.__table__), message_rows)
+    session.commit()
+    return users[0].id
+
+
+def timed_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conversation listing.")
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--other-users", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.db import crud, models
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        models.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        user_id = seed(session, args.conversations, args.messages, args.other_users)
+        session.execute(text("ANALYZE"))
+        print(f"{args.conversations} conversations x {args.messages} messages for the user "
+              f"({args.other_users} other users)")
+
+        def legacy():
+            session.expire_all()
+            for conversation in crud.get_user_conversations(session, user_id):
+                conversation.messages[-1:] # Lazy load: one query per conversation
+
+        def first_page():
+            return crud.get_conversation_page(session, user_id, limit=args.page_size)
+
+        rows = crud.get_conversation_page(session, user_id, limit=args.conversations - args.page_size)
+        deep_cursor = (rows[-1].created_at, rows[-1].id)
+
+        def deep_page():
+            return crud.get_conversation_page(session, user_id, limit=args.page_size, before=deep_cursor)
+
+        assert len(deep_page()) == args.page_size and first_page()[0].message_count == args.messages
+        print(f"legacy: all conversations + lazy messages {timed_ms(legacy, repeat=1):>10.1f} ms")
+        print(f"keyset: first page                        {timed_ms(first_page):>10.2f} ms")
+        print(f"keyset: page at offset {args.conversations - args.page_size:<6}             {timed_ms(deep_page):>10.2f} ms")
+
+        query_plan(engine, deep_page)
+
+
+def query_plan(engine, run_query) -> None:
+    """Prints SQLite's plan for the last statement run_query() executes."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run_query()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = captured[-1]
+    print("query plan (deep page):")
+    with engine.connect() as connection:
+        for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+            print("  ", row[-1])
+
+
+if __name__ == "__main__":
+    main()
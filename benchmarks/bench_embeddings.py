@@ -0,0 +1,108 @@
+"""
+Embedding backend throughput and parity.
+
+Encodes the same texts with the reference backend ("torch") and each candidate
+backend, then reports:
+  - throughput for single queries (batch of 1, the RAG search path) and for
+    bulk encoding (the ingestion path), in texts per second;
+  - cosine agreement with the reference vectors (min / mean).
+Exits non-zero if any candidate's minimum cosine falls below --min-cosine,
+so it doubles as the parity check before switching `embedding_backend`.
+Backends that cannot be created are listed as not checked; that is an error
+too when they were requested explicitly with --backends.
+
+Usage: python -m benchmarks.bench_embeddings [--backends torch-int8 onnx] [--min-cosine 0.98]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.embeddings import TORCH, TORCH_INT8, ONNX, create_embedding_backend
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_texts(path: Path, count: int) -> list:
+    """Sentence-sized snippets from the sample documents, repeated up to `count`."""
+    raw = path.read_text(encoding="utf-8") if path.exists() else ""
+    sentences = [s.strip() for s in raw.replace("\n", " ").split(".") if len(s.strip()) > 20]
+    if not sentences:
+        sentences = [f"Sample sentence number {i} about internal procedures." for i in range(50)]
+    texts = []
+    while len(texts) < count:
+        texts.extend(f"{s} ({len(texts) + i})" for i, s in enumerate(sentences))
+    return texts[:count]
+
+
+def throughput(backend, texts: list, batch_size: int) -> float:
+    backend.encode(texts[:batch_size], batch_size=batch_size) # Warm-up
+    started = time.perf_counter()
+    if batch_size == 1:
+        for text in texts:
+            backend.encode([text], batch_size=1)
+    else:
+        backend.encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends against the torch reference.")
+    parser.add_argument("--backends", nargs="+", help=f"Candidates to compare (default: {TORCH_INT8} {ONNX}).")
+    parser.add_argument("--model", default=settings.embedding_model_name)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200, help="Texts encoded one at a time.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--source", type=Path, default=REPO_ROOT / "data" / "your_documents.txt")
+    args = parser.parse_args()
+
+    requested = args.backends is not None
+    backends = args.backends if requested else [TORCH_INT8, ONNX]
+    texts = load_texts(args.source, args.texts)
+    reference = create_embedding_backend(args.model, TORCH)
+    reference_vectors = reference.encode(texts, batch_size=args.batch_size)
+
+    print(f"model {args.model}, {len(texts)} texts, dimension {reference.get_dimension()}")
+    print(f"{'backend':<12}{'query/s':>10}{'bulk/s':>10}{'min cos':>10}{'mean cos':>10}")
+    print(f"{TORCH:<12}{throughput(reference, texts[:args.queries], 1):>10.1f}"
+          f"{throughput(reference, texts, args.batch_size):>10.1f}{1.0:>10.4f}{1.0:>10.4f}")
+
+    failed, skipped = [], []
+    for name in backends:
+        try:
+            candidate = create_embedding_backend(args.model, name)
+        except Exception as e: # Missing optional dependency, unavailable export, ...
+            print(f"{name:<12} unavailable: {e}")
+            skipped.append(name)
+            continue
+        cosines = cosine_rows(reference_vectors, candidate.encode(texts, batch_size=args.batch_size))
+        print(f"{name:<12}{throughput(candidate, texts[:args.queries], 1):>10.1f}"
+              f"{throughput(candidate, texts, args.batch_size):>10.1f}"
+              f"{cosines.min():>10.4f}{cosines.mean():>10.4f}")
+        if cosines.min() < args.min_cosine:
+            failed.append(name)
+
+    if skipped:
+        print(f"Parity NOT checked (backend unavailable): {', '.join(skipped)}")
+    if failed:
+        print(f"Parity check FAILED (min cosine < {args.min_cosine}): {', '.join(failed)}")
+        sys.exit(1)
+    if skipped and requested:
+        sys.exit(2)
+    checked = [name for name in backends if name not in skipped]
+    if checked:
+        print(f"Parity check passed: {', '.join(checked)}.")
+
+
+if __name__ == "__main__":
+    main()
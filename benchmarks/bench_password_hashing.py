@@ -0,0 +1,125 @@
+"""
+Login storm vs. chat latency.
+
+Serves the real auth router in-process together with a stand-in `/chat` probe
+that awaits a fixed "LLM" delay, then measures probe latency:
+  1. with no logins,
+  2. during a login storm where bcrypt runs inline on the event loop (old behaviour),
+  3. during the same storm with bcrypt on the password hashing pool.
+With the pool, p95/p99 in (3) should stay close to (1).
+
+Usage: python -m benchmarks.bench_password_hashing [--logins 64] [--login-concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# Keep the benchmark's users out of the real database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_auth.db")
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints import auth
+from app.core import security
+from app.core.hashing_pool import password_hash_pool
+from app.db import crud
+from app.db.database import Base, engine, get_db
+
+
+def build_app(probe_delay: float) -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api/v1/auth")
+
+    @app.post("/api/v1/auth/token-inline")
+    async def login_inline(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+        # The pre-pool implementation: bcrypt directly inside the async handler
+        user = crud.get_user_by_username(db, username=form_data.username)
+        if not user or not security.verify_password(form_data.password, user.hashed_password):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.get("/chat-probe")
+    async def chat_probe():
+        await asyncio.sleep(probe_delay) # Stands in for awaiting the LLM
+        return {"ok": True}
+
+    return app
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": statistics.fmean(ordered)}
+
+
+async def probe_loop(client: httpx.AsyncClient, stop: asyncio.Event, interval: float, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/chat-probe")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def login_storm(client: httpx.AsyncClient, path: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.post(path, data={"username": "bench", "password": "bench-password"})
+
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def run_phase(client, login_path, args) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    probes = [asyncio.create_task(probe_loop(client, stop, args.probe_interval, samples)) for _ in range(args.probes)]
+    started = time.perf_counter()
+    if login_path:
+        await login_storm(client, login_path, args.logins, args.login_concurrency)
+    else:
+        await asyncio.sleep(args.idle_seconds)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*probes)
+    result = percentiles(samples)
+    result["phase_seconds"] = elapsed
+    return result
+
+
+async def main(args):
+    Base.metadata.create_all(bind=engine)
+    app = build_app(args.probe_delay)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/v1/auth/register", json={"username": "bench", "password": "bench-password"})
+
+        phases = [
+            ("idle", None),
+            ("storm, bcrypt inline", "/api/v1/auth/token-inline"),
+            ("storm, bcrypt on pool", "/api/v1/auth/token"),
+        ]
+        print(f"probe delay {args.probe_delay * 1000:.0f} ms, {args.logins} logins at concurrency {args.login_concurrency}")
+        print(f"{'phase':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'secs':>8}")
+        for name, path in phases:
+            r = await run_phase(client, path, args)
+            print(f"{name:<24}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['phase_seconds']:>8.1f}")
+        print("password pool:", password_hash_pool.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /chat-style latency during a login storm.")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    parser.add_argument("--probes", type=int, default=8, help="Concurrent chat-probe loops.")
+    parser.add_argument("--probe-delay", type=float, default=0.05, help="Simulated LLM await per probe (seconds).")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    asyncio.run(main(parser.parse_args()))
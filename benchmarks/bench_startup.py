@@ -0,0 +1,95 @@
+"""
+Cold-start benchmark.
+
+Starts a fresh interpreter per run, imports `app.main`, enters the app lifespan
+and records:
+  - import:  time to import app.main
+  - health:  time from process start until /health answers 200
+  - ready:   time until /health/ready answers 200 (models warm); "not reached"
+             if a required subsystem fails or --ready-timeout passes
+Each run is a separate process so nothing is cached between runs in-process.
+GROQ_API_KEY defaults to a dummy value: the warm-up only creates the client,
+it never calls the API, but the client refuses to be created without a key.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--ready-timeout 120]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+from app.core.readiness import FAILED, REQUIRED_SUBSYSTEMS
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    assert client.get("/health").status_code == 200
+    healthy = time.perf_counter()
+    ready = None
+    deadline = healthy + float(sys.argv[1])
+    while time.perf_counter() < deadline:
+        response = client.get("/health/ready")
+        if response.status_code == 200:
+            ready = time.perf_counter()
+            break
+        if any(response.json()["subsystems"][name]["state"] == FAILED for name in REQUIRED_SUBSYSTEMS):
+            break # Will never become ready
+        time.sleep(0.05)
+    report = client.get("/health/ready").json()
+print("RESULT " + json.dumps({
+    "import": imported - started,
+    "health": healthy - started,
+    "ready": (ready - started) if ready else None,
+    "subsystems": report["subsystems"],
+}))
+"""
+
+
+def run_once(ready_timeout: float) -> dict:
+    env = {**os.environ, "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench-dummy-key")}
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD, str(ready_timeout)],
+            cwd=REPO_ROOT, capture_output=True, text=True, env=env, timeout=ready_timeout + 60,
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Benchmark child did not exit within {ready_timeout + 60:.0f}s")
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"Benchmark child failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start time to /health and /health/ready.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    results = [run_once(args.ready_timeout) for _ in range(args.runs)]
+    print(f"{'metric':<10}{'min s':>10}{'median s':>10}{'max s':>10}")
+    for metric in ("import", "health", "ready"):
+        values = [r[metric] for r in results if r[metric] is not None]
+        if not values:
+            print(f"{metric:<10}{'(not reached)':>30}")
+            continue
+        print(f"{metric:<10}{min(values):>10.3f}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+    missed = sum(r["ready"] is None for r in results)
+    if missed:
+        failed = [f"{name} ({entry.get('detail', 'failed')})" for name, entry in results[-1]["subsystems"].items()
+                  if entry["state"] == "failed"]
+        print(f"Ready never reached in {missed} of {len(results)} runs"
+              + (f"; failed in the last run: {', '.join(failed)}" if failed else f" within {args.ready_timeout:.0f}s"))
+    print("Last run subsystems:", json.dumps(results[-1]["subsystems"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: the tool-call parser vs the previous regex parser.
+
+The previous implementation (kept below as `legacy_parse`) ran two re.match
+calls plus json.loads on every response and only matched calls at the very
+start of the text. Cases cover the common path (an answer with no tool call,
+with and without markup), calls in each format and a call wrapped in prose
+(which the legacy parser misses). The new parser is called with the agent's
+tool names, as call_model does.
+
+Usage:
+    python -m benchmarks.bench_tool_call_parser --number 2000
+"""
+import argparse
+import json
+import re
+import timeit
+
+from app.agent.tool_call_parser import parse_tool_calls
+
+
+def legacy_parse(ai_message_content: str):
+    content = ai_message_content.strip()
+    xml_match = re.match(r"<(\w+)>(.*?)</\1>", content, re.DOTALL)
+    if xml_match:
+        try:
+            tool_input_dict = json.loads(xml_match.group(2).strip())
+            return (xml_match.group(1), tool_input_dict) if isinstance(tool_input_dict, dict) else None
+        except json.JSONDecodeError:
+            return None
+    func_match = re.match(r"<function=(\w+)\s*({.*?})\s*</function>", content, re.DOTALL)
+    if func_match:
+        try:
+            tool_input_dict = json.loads(func_match.group(2).strip())
+            return (func_match.group(1), tool_input_dict) if isinstance(tool_input_dict, dict) else None
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+ANSWER = ("The internal guide describes the onboarding steps in detail, including accounts, "
+          "hardware and the first-week schedule. ") * 20
+TOOL_NAMES = {"WebSearch", "InternalKnowledgeSearch"} # As in app.agent.graph, without importing the agent
+ARGS = {"query": "onboarding guide {2024}", "filters": {"team": "platform", "tags": ["a", "b"]}}
+CASES = {
+    "plain answer (2 KB)": ANSWER,
+    "answer with markup": ANSWER + "Run `make setup`, then open <b>Settings</b>.",
+    "xml call": f"<InternalKnowledgeSearch>{json.dumps(ARGS)}</InternalKnowledgeSearch>",
+    "function call": f"<function=WebSearch{json.dumps(ARGS)}</function>",
+    "fenced json call": f"```json\n{json.dumps({'name': 'WebSearch', 'arguments': ARGS})}\n```",
+    "call wrapped in prose": f"Let me look that up. <function=WebSearch{json.dumps(ARGS)}</function> One moment.",
+}
+
+
+def parse_known(text: str):
+    return parse_tool_calls(text, TOOL_NAMES)
+
+
+def per_call_us(fn, text: str, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(text), number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tool-call parser.")
+    parser.add_argument("--number", type=int, default=2000, help="Calls per timing run.")
+    args = parser.parse_args()
+
+    print(f"{'case':<24} {'legacy us':>10} {'new us':>10}  legacy found / new found")
+    for name, text in CASES.items():
+        legacy_us, new_us = per_call_us(legacy_parse, text, args.number), per_call_us(parse_known, text, args.number)
+        found_legacy = legacy_parse(text) is not None
+        found_new = len(parse_known(text))
+        print(f"{name:<24} {legacy_us:>10.1f} {new_us:>10.1f}  {found_legacy} / {found_new}")
+
+
+if __name__ == "__main__":
+    main()
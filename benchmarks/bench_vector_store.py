@@ -0,0 +1,105 @@
+"""
+Sharded vector store: fan-out search latency, result parity and eviction.
+
+Builds random unit vectors in a temporary store (two collections, split into
+shards through app/rag/ingestion.append_to_store), then reports:
+  - search latency over all shards with 1 search thread (sequential) vs
+    --threads threads (fan-out; default 0 = one per CPU, the app's default);
+  - whether the merged top k equals a search of one flat index holding
+    every vector (exits 1 if not);
+  - shard loads and evictions when the memory budget holds only some shards.
+
+Usage: python -m benchmarks.bench_vector_store [--vectors 200000] [--shards 8] [--dim 384] [--threads 0]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def latency_ms(store, queries: np.ndarray, k: int, collections=None) -> float:
+    started = time.perf_counter()
+    for query in queries:
+        store.search_embedding(query[None, :], k=k, collections=collections)
+    return (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sharded vector store.")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--threads", type=int, default=0, help="Fan-out threads to compare with 1 (0 = one per CPU).")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    import faiss
+    from app.core.config import settings
+
+    rng = np.random.default_rng(0)
+    vectors = unit_vectors(rng, args.vectors, args.dim)
+    chunks = [f"chunk {i}" for i in range(args.vectors)]
+    queries = unit_vectors(rng, args.queries, args.dim)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.vector_store_path = tmp
+        settings.vector_store_reload_check_seconds = 3600.0
+        settings.vector_store_shard_max_vectors = -(-args.vectors // args.shards)
+        from app.rag.ingestion import append_to_store
+        from app.rag.vector_store import FAISSVectorStore
+
+        half = args.vectors // 2
+        append_to_store(vectors[:half], chunks[:half], "team-a")
+        append_to_store(vectors[half:], chunks[half:], "team-b")
+
+        store = FAISSVectorStore()
+        store.embedding_model = object() # Searches below pass embeddings directly
+        store.ensure_store_loaded()
+        print(f"{args.vectors} vectors x {args.dim} dims in {store.shard_count()} shards, "
+              f"collections {store.collection_names()}, {store.loaded_bytes / 1e6:.0f} MB loaded")
+
+        # Parity with a single flat index
+        flat = faiss.IndexFlatL2(args.dim)
+        flat.add(vectors)
+        _, expected = flat.search(queries, args.k)
+        for query, expected_ids in zip(queries, expected):
+            got = [chunk for _, chunk in store.search_embedding(query[None, :], k=args.k)]
+            if got != [chunks[i] for i in expected_ids]:
+                print(f"FAILED: merged top {args.k} differs from the flat index: {got}")
+                sys.exit(1)
+        print(f"parity: merged top {args.k} matches one flat index for {args.queries} queries")
+
+        for threads in (1, args.threads):
+            settings.vector_store_search_threads = threads
+            store._pool = None
+            latency_ms(store, queries[:5], args.k) # Warm-up (starts the pool)
+            label = f"{threads} thread(s)" if threads else f"auto ({os.cpu_count()} CPUs)"
+            print(f"search all shards, {label}: {latency_ms(store, queries, args.k):>8.2f} ms/query")
+        print(f"search one collection:      {latency_ms(store, queries, args.k, ['team-a']):>8.2f} ms/query")
+
+        # Memory budget that holds one collection (about half of the shards)
+        shard_mb = store.loaded_bytes / store.shard_count() / (1024 * 1024)
+        settings.vector_store_memory_budget_mb = math.ceil(shard_mb * math.ceil(store.shard_count() / 2)) + 1
+        budgeted = FAISSVectorStore()
+        budgeted.embedding_model = object()
+        budgeted.ensure_store_loaded()
+        loads = latency_ms(budgeted, queries[:10], args.k)
+        print(f"budget {settings.vector_store_memory_budget_mb} MB: {len(budgeted._loaded)} shards warm")
+        print(f"  search all shards (loads and evicts): {loads:>8.2f} ms/query")
+        latency_ms(budgeted, queries[:1], args.k, ["team-a"]) # Bring team-a back in
+        print(f"  search team-a (resident):             {latency_ms(budgeted, queries, args.k, ['team-a']):>8.2f} ms/query, "
+              f"{budgeted.loaded_bytes / (1024 * 1024):.0f} MB loaded")
+
+
+if __name__ == "__main__":
+    main()
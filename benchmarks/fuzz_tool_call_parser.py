@@ -0,0 +1,112 @@
+"""
+Randomised property checks for app/agent/tool_call_parser.py.
+
+Each iteration builds a text with a known list of tool calls (random format,
+random nested arguments with tricky strings) embedded in random prose, then
+checks that:
+  1. parse_tool_calls() finds exactly those calls, in order;
+  2. given a subset of the tool names, it finds exactly the calls to those
+     (this also exercises the fast path that skips texts without any name);
+  3. random garbage built from the parser's special characters never raises.
+Exits with status 1 and prints a counterexample on the first failure.
+
+Usage:
+    python -m benchmarks.fuzz_tool_call_parser --iterations 5000 --seed 1
+"""
+import argparse
+import json
+import random
+import sys
+
+from app.agent.tool_call_parser import ParsedToolCall, parse_tool_calls
+
+TOOL_NAMES = ["WebSearch", "InternalKnowledgeSearch", "get_weather", "Tool2"]
+# Prose that must never be mistaken for a tool call
+PROSE = [
+    "Sure,", "here is", "the answer:", "a < b and c > d", "<b>bold</b>", "{not json", "}", "`inline code`",
+    "``` plain fence ```", "<function=>", "<>", "emoji \U0001F600", "line\nbreak", "\"quoted\"", "back\\slash",
+]
+# Strings that stress the brace/string scanner when they appear inside arguments
+TRICKY = ["{", "}", "\"", "\\", "\\\"", "<function=X{", "</WebSearch>", "```", "{\"a\": 1}", "\u00e9\u4e2d", ""]
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(6 if depth < 3 else 3)
+    if kind == 0:
+        return rng.choice(TRICKY) + str(rng.randrange(100)) + rng.choice(TRICKY)
+    if kind == 1:
+        return rng.randrange(-1000, 1000)
+    if kind == 2:
+        return rng.choice([True, False, None, 1.5])
+    if kind == 3:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return random_args(rng, depth + 1)
+
+
+def random_args(rng: random.Random, depth: int = 0) -> dict:
+    return {f"k{i}{rng.choice(TRICKY)}": random_value(rng, depth) for i in range(rng.randrange(4))}
+
+
+def render_call(rng: random.Random, name: str, args: dict) -> str:
+    body = json.dumps(args, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    form = rng.randrange(4)
+    if form == 0:
+        return f"<{name}>{rng.choice(['', ' ', chr(10)])}{body}{rng.choice(['', ' '])}</{name}>"
+    if form == 1:
+        return f"<function={name}{rng.choice(['', '>', ' '])}{body}{rng.choice(['', '</function>', ' </function>'])}"
+    if form == 2:
+        fenced = {"name": name, rng.choice(["arguments", "parameters", "args"]): args}
+        return f"```{rng.choice(['json', ''])}\n{json.dumps(fenced)}\n```"
+    # OpenAI style: arguments as a JSON-encoded string
+    return f"```json\n{json.dumps({'name': name, 'arguments': json.dumps(args)})}\n```"
+
+
+def random_document(rng: random.Random):
+    parts, expected = [], []
+    for _ in range(rng.randrange(6)):
+        parts.append(" ".join(rng.choice(PROSE) for _ in range(rng.randrange(4))))
+        if rng.random() < 0.6:
+            name, args = rng.choice(TOOL_NAMES), random_args(rng)
+            parts.append(render_call(rng, name, args))
+            expected.append(ParsedToolCall(name, args))
+    return " ".join(parts), expected
+
+
+def random_garbage(rng: random.Random) -> str:
+    alphabet = "<>{}\"\\`=/ ajsonfuctiWebSearch\n:,[]"
+    return "".join(rng.choice(alphabet) for _ in range(rng.randrange(200)))
+
+
+def fail(kind: str, text: str, got, expected) -> None:
+    print(f"FAILED ({kind})\ntext: {text!r}\ngot:      {got}\nexpected: {expected}")
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Randomised property checks for the tool-call parser.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    for _ in range(args.iterations):
+        text, expected = random_document(rng)
+        got = parse_tool_calls(text)
+        if got != expected:
+            fail("one-shot", text, got, expected)
+        names = set(rng.sample(TOOL_NAMES, rng.randrange(len(TOOL_NAMES) + 1)))
+        got = parse_tool_calls(text, names)
+        if got != [call for call in expected if call.name in names]:
+            fail(f"tool_names={sorted(names)}", text, got, [call for call in expected if call.name in names])
+
+        garbage = random_garbage(rng)
+        try:
+            parse_tool_calls(garbage)
+        except Exception as e:
+            fail("garbage raised", garbage, repr(e), "no exception")
+
+    print(f"OK: {args.iterations} documents and {args.iterations} garbage inputs (seed {args.seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+End-to-end load test of /api/v1/chat against the real app with offline stand-ins.
+
+Starts `uvicorn benchmarks.standin_app:app` in a subprocess (fake LLM, fake
+search, local fixture pages, temporary SQLite database), registers a few users,
+then drives /api/v1/chat at the given concurrency and reports latency
+percentiles (of successful requests), throughput, status counts, server RSS and
+the server's per-route counts and mean latency (from /metrics). With
+--rag-prefetch it also reports the prefetch hit rate and wasted retrieval time.
+Rate limits are lifted unless --admission-limits is given. Results are written as JSON
+(results/latest.json, not committed); pass --baseline to compare against the committed
+baseline (results/baseline.json, or another file) and fail on regressions. Compare runs
+made with the same options as the baseline (its "config") on similar hardware.
+
+Usage:
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+    python -m benchmarks.load_test --requests 60 --concurrency 8 --baseline --tolerance 0.15
+    python -m benchmarks.load_test --requests 60 --concurrency 8 --save-baseline   # record a new baseline
+    python -m benchmarks.load_test --login-storm 64   # concurrent logins during the run
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+BASELINE_FILE = RESULTS_DIR / "baseline.json"
+
+MESSAGES = [
+    "hello there!",
+    "thanks, that helps",
+    "what is in our internal onboarding guide?",
+    "what are the latest developments in battery technology?",
+    "who won the most recent championship final?",
+    "summarise the documented deployment procedure",
+]
+
+# Metrics compared against a baseline: (name, higher_is_better)
+COMPARED = [("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("throughput_rps", True)]
+# Options that change the workload, so must match the baseline's
+COMPARED_CONFIG = [
+    "requests", "concurrency", "users", "llm_latency", "llm_tokens_per_second", "llm_completion_tokens",
+    "tool_call_rate", "fixture_latency", "login_storm", "admission_limits", "rag_prefetch",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    env = os.environ.copy()
+    env.update({
+        "DATABASE_URL": f"sqlite:///{workdir}/loadtest.db",
+        "GROQ_API_KEY": "offline-stand-in",
+        "HF_HUB_OFFLINE": env.get("HF_HUB_OFFLINE", "1"), # Never reach out to the model hub
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "BENCH_LLM_COMPLETION_TOKENS": str(args.llm_completion_tokens),
+        "BENCH_TOOL_CALL_RATE": str(args.tool_call_rate),
+        "BENCH_FIXTURE_LATENCY": str(args.fixture_latency),
+        "RAG_PREFETCH_ENABLED": str(args.rag_prefetch).lower(),
+    })
+    if not args.admission_limits:
+        # Measure raw capacity: lift the per-user/global rate limits and per-user concurrency cap
+        env.update({
+            "RATE_LIMIT_USER_PER_MINUTE": "1e9", "RATE_LIMIT_USER_BURST": "1000000",
+            "RATE_LIMIT_GLOBAL_PER_SECOND": "1e9", "RATE_LIMIT_GLOBAL_BURST": "1000000",
+            "AGENT_MAX_CONCURRENT_RUNS_PER_USER": "1000000",
+        })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.standin_app:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+        stdout=None if args.server_output else subprocess.DEVNULL,
+        stderr=None if args.server_output else subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready in time")
+
+
+async def make_user(client: httpx.AsyncClient, i: int) -> dict:
+    username, password = f"loadtest-{i}", "loadtest-password"
+    await client.post("/api/v1/auth/register", json={"username": username, "password": password})
+    response = await client.post("/api/v1/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def login_storm(client: httpx.AsyncClient, total: int):
+    """Fires `total` logins at once (bcrypt load) while the chat load runs."""
+    async def one():
+        try:
+            await client.post("/api/v1/auth/token", data={"username": "loadtest-0", "password": "loadtest-password"})
+        except httpx.HTTPError:
+            pass
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def drive(client: httpx.AsyncClient, users: list, args) -> dict:
+    latencies, statuses = [], {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def worker(worker_id: int):
+        headers = users[worker_id % len(users)]
+        conversation_id = None
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            payload = {"user_message": MESSAGES[i % len(MESSAGES)], "conversation_id": conversation_id}
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/chat", json=payload, headers=headers, timeout=args.request_timeout)
+                status = response.status_code
+                if status == 200:
+                    conversation_id = response.json()["conversation_id"]
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if status == 200: # Percentiles describe served requests; rejections are counted in statuses
+                latencies.append((time.perf_counter() - started) * 1000)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(worker(w)) for w in range(args.concurrency)]
+    if args.login_storm:
+        tasks.append(asyncio.create_task(login_storm(client, args.login_storm)))
+    await asyncio.gather(*tasks)
+    return {"latencies": latencies, "statuses": statuses, "elapsed": time.perf_counter() - started}
+
+
+async def server_report(client: httpx.AsyncClient) -> dict:
+    """
+    Per-route turn counts and mean latency, plus knowledge-base prefetch
+    outcomes and wasted retrieval time, from the server's Prometheus metrics.
+    """
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return {"routes": {}, "rag_prefetch": {}}
+    totals, outcomes, wasted = {}, {}, 0.0
+    for line in response.text.splitlines():
+        if match := re.match(r'agent_route_duration_seconds_(sum|count)\{route="([^"]+)"\} (\S+)', line):
+            kind, route, value = match.groups()
+            totals.setdefault(route, {})[kind] = float(value)
+        elif match := re.match(r'rag_prefetch_total\{outcome="([^"]+)"\} (\S+)', line):
+            outcomes[match.group(1)] = int(float(match.group(2)))
+        elif match := re.match(r'rag_prefetch_wasted_seconds_total (\S+)', line):
+            wasted = float(match.group(1))
+    routes = {
+        route: {"count": int(t.get("count", 0)), "mean_ms": 1000 * t.get("sum", 0) / t["count"] if t.get("count") else 0.0}
+        for route, t in sorted(totals.items())
+    }
+    prefetch = {}
+    if outcomes:
+        prefetch = {"outcomes": outcomes, "hit_rate": outcomes.get("hit", 0) / sum(outcomes.values()), "wasted_ms": 1000 * wasted}
+    return {"routes": routes, "rag_prefetch": prefetch}
+
+
+def percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def sample_rss(pid: int, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        try:
+            samples.append(read_rss_mb(pid))
+        except FileNotFoundError:
+            return
+        await asyncio.sleep(0.25)
+
+
+async def run(args) -> dict:
+    port = free_port()
+    server = start_server(args, port)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            await wait_ready(client, args.startup_timeout)
+            users = [await make_user(client, i) for i in range(args.users)]
+            rss_idle = read_rss_mb(server.pid)
+
+            stop, rss_samples = asyncio.Event(), []
+            sampler = asyncio.create_task(sample_rss(server.pid, stop, rss_samples))
+            outcome = await drive(client, users, args)
+            stop.set()
+            await sampler
+            report = await server_report(client)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    ordered = sorted(outcome["latencies"])
+    ok = outcome["statuses"].get("200", 0)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output")},
+        "requests": sum(outcome["statuses"].values()),
+        "ok": ok,
+        "statuses": outcome["statuses"],
+        "p50_ms": percentile(ordered, 0.50),
+        "p95_ms": percentile(ordered, 0.95),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": ordered[-1] if ordered else 0.0,
+        "throughput_rps": ok / outcome["elapsed"] if outcome["elapsed"] else 0.0,
+        "rss_idle_mb": rss_idle,
+        "rss_peak_mb": max(rss_samples, default=rss_idle),
+        **report,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Returns human-readable regressions beyond the tolerance (relative)."""
+    regressions = []
+    for name, higher_is_better in COMPARED:
+        old, new = baseline.get(name), result.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f"{name}: {old:.1f} -> {new:.1f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/v1/chat with offline stand-ins.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds before the first token.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--llm-completion-tokens", type=int, default=120)
+    parser.add_argument("--tool-call-rate", type=float, default=0.5)
+    parser.add_argument("--fixture-latency", type=float, default=0.05, help="Seconds per fixture page.")
+    parser.add_argument("--login-storm", type=int, default=0, help="Concurrent logins fired during the run.")
+    parser.add_argument("--admission-limits", action="store_true",
+                        help="Keep the app's rate limits and per-user caps (overload test) instead of lifting them.")
+    parser.add_argument("--rag-prefetch", action="store_true", help="Enable the speculative knowledge-base prefetch.")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--server-output", action="store_true", help="Show the server's stdout/stderr.")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--save-baseline", type=Path, nargs="?", const=BASELINE_FILE,
+                        help=f"Also write the result to this baseline file (default {BASELINE_FILE.relative_to(REPO_ROOT)}).")
+    parser.add_argument("--baseline", type=Path, nargs="?", const=BASELINE_FILE,
+                        help=f"Compare against this baseline and fail on regressions (default {BASELINE_FILE.relative_to(REPO_ROOT)}).")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(f"requests {result['requests']} ok {result['ok']} statuses {result['statuses']}")
+    print(f"latency ms  p50 {result['p50_ms']:.0f}  p95 {result['p95_ms']:.0f}  p99 {result['p99_ms']:.0f}  max {result['max_ms']:.0f}")
+    print(f"throughput {result['throughput_rps']:.2f} req/s   RSS idle {result['rss_idle_mb']:.0f} MB peak {result['rss_peak_mb']:.0f} MB")
+    for route, stats in result["routes"].items():
+        print(f"route {route:<11} {stats['count']:>5} turns  mean {stats['mean_ms']:.0f} ms")
+    if result["rag_prefetch"]:
+        prefetch = result["rag_prefetch"]
+        print(f"rag prefetch hit rate {prefetch['hit_rate']:.0%} {prefetch['outcomes']}  wasted {prefetch['wasted_ms']:.0f} ms")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2, default=str))
+        print(f"Wrote {path}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        differing = sorted(key for key in COMPARED_CONFIG if baseline.get("config", {}).get(key) != result["config"].get(key))
+        if differing:
+            print(f"WARNING: options differ from the baseline's ({', '.join(differing)}); the comparison may not be meaningful")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS vs baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
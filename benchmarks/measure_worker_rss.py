@@ -0,0 +1,117 @@
+"""
+Memory use of N gunicorn workers, with and without model preloading.
+
+For each mode, starts `gunicorn -c gunicorn_conf.py app.main:app` with N workers,
+waits until every worker has finished warming up, then sums RSS and PSS over
+the master and its workers. RSS counts shared pages once per process; PSS splits
+them between the processes sharing them, so PSS is the number that shows the
+copy-on-write savings.
+
+The savings come mostly from the embedding model, so the "model" column says
+whether the workers actually had it loaded; a run without it (e.g. offline with
+an empty Hugging Face cache) only measures the shared Python/LangChain heap.
+
+Usage: python -m benchmarks.measure_worker_rss [--workers 4 8] [--port 8765]
+Linux only (reads /proc).
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def read_memory_kb(pid: int) -> dict:
+    values = {"Rss": 0, "Pss": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in values:
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def child_pids(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def wait_until_warm(base_url: str, workers: int, timeout: float) -> dict:
+    """
+    Polls /health/ready until every worker we hit reports its embedding model
+    settled. Returns the subsystem states of the last report.
+    """
+    deadline = time.monotonic() + timeout
+    settled = 0
+    states = {}
+    while time.monotonic() < deadline and settled < workers * 5:
+        try:
+            report = httpx.get(f"{base_url}/health/ready", timeout=2).json()
+            states = {name: entry["state"] for name, entry in report["subsystems"].items()}
+            if states["embedding_model"] in ("ready", "failed") and states["vector_store"] in ("ready", "failed"):
+                settled += 1
+            else:
+                settled = 0
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return states
+
+
+def measure(workers: int, preload: bool, port: int, timeout: float) -> dict:
+    env = os.environ.copy()
+    env.update({
+        "WEB_CONCURRENCY": str(workers),
+        "PRELOAD_MODELS": "true" if preload else "false",
+        "BIND": f"127.0.0.1:{port}",
+    })
+    env.setdefault("GROQ_API_KEY", "bench-dummy-key") # The agent warm-up only builds the client
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "app.main:app"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        states = wait_until_warm(f"http://127.0.0.1:{port}", workers, timeout)
+        pids = [proc.pid] + child_pids(proc.pid)
+        totals = {"Rss": 0, "Pss": 0}
+        for pid in pids:
+            for key, value in read_memory_kb(pid).items():
+                totals[key] += value
+        return {"processes": len(pids), "rss_mb": totals["Rss"] / 1024, "pss_mb": totals["Pss"] / 1024,
+                "model": states.get("embedding_model", "unknown")}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare worker memory with and without model preloading.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4],
+                        help="Worker counts to measure. Below 4 the shared pages barely show up in PSS.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Max seconds to wait for warm-up.")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'mode':>12}{'procs':>7}{'RSS MB':>10}{'PSS MB':>10}{'model':>10}")
+    without_model = False
+    for n in args.workers:
+        for preload in (False, True):
+            r = measure(n, preload, args.port, args.timeout)
+            mode = "preload" if preload else "per-worker"
+            print(f"{n:>8}{mode:>12}{r['processes']:>7}{r['rss_mb']:>10.0f}{r['pss_mb']:>10.0f}{r['model']:>10}")
+            without_model = without_model or r["model"] != "ready"
+    if without_model:
+        print("\nThe embedding model was not loaded in every run; those rows do not include its memory.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+The real FastAPI app with offline stand-ins installed, for load tests:
+
+    uvicorn benchmarks.standin_app:app
+
+Stand-in behaviour is configured through environment variables (all optional):
+BENCH_LLM_LATENCY, BENCH_LLM_TOKENS_PER_SECOND, BENCH_LLM_COMPLETION_TOKENS,
+BENCH_TOOL_CALL_RATE, BENCH_FIXTURE_LATENCY, BENCH_FIXTURE_PAGE_WORDS.
+"""
+import os
+
+from benchmarks.standins import FakeChatGroq, make_fake_search, start_fixture_server
+
+_fixture_server = start_fixture_server(
+    latency=float(os.getenv("BENCH_FIXTURE_LATENCY", "0.05")),
+    page_words=int(os.getenv("BENCH_FIXTURE_PAGE_WORDS", "800")),
+)
+
+from app.agent import graph, tools # noqa: E402
+
+graph.set_chat_model(FakeChatGroq(
+    first_token_latency=float(os.getenv("BENCH_LLM_LATENCY", "0.3")),
+    tokens_per_second=float(os.getenv("BENCH_LLM_TOKENS_PER_SECOND", "400")),
+    completion_tokens=int(os.getenv("BENCH_LLM_COMPLETION_TOKENS", "120")),
+    tool_call_rate=float(os.getenv("BENCH_TOOL_CALL_RATE", "0.5")),
+))
+tools.duckduckgo_search = make_fake_search(f"http://127.0.0.1:{_fixture_server.server_port}")
+
+from app.main import app # noqa: E402,F401
@@ -0,0 +1,118 @@
+"""
+Offline stand-ins for the external services the agent talks to, so the real
+FastAPI app can be load-tested without Groq, DuckDuckGo or live websites:
+
+- FakeChatGroq: a chat model with configurable latency and token rate that
+  answers directly or emits tool calls, like the real model does.
+- fake_duckduckgo_search: returns links to the local fixture server.
+- start_fixture_server: a threaded local HTTP server with HTML pages.
+"""
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_WORDS = ("the agent found that this result matches the question and the sources agree on "
+          "several points which are summarised here for the user in plain language").split()
+
+
+class FakeChatGroq(BaseChatModel):
+    """
+    Chat model stand-in. Each call sleeps `first_token_latency` plus
+    `completion_tokens / tokens_per_second`. When tools are bound, on the first
+    step of a turn it emits a tool call with probability `tool_call_rate`; once
+    a tool result is in the conversation it answers.
+    """
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 400.0
+    completion_tokens: int = 120
+    tool_call_rate: float = 0.5
+    tool_names: List[str] = ["WebSearch", "InternalKnowledgeSearch"]
+    seed: Optional[int] = None
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-groq"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatGroq":
+        # Tool calls are decided by tool_call_rate, not by the schemas
+        return self.model_copy(update={"tools_bound": True})
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        rng = random.Random(self.seed) if self.seed is not None else random
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        last_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        tool_already_used = isinstance(messages[-1], ToolMessage)
+
+        if self.tools_bound and not tool_already_used and last_human is not None and rng.random() < self.tool_call_rate:
+            completion_tokens = 20
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "name": rng.choice(self.tool_names),
+                    "args": {"query": str(last_human.content)[:200]},
+                }],
+            )
+        else:
+            completion_tokens = self.completion_tokens
+            message = AIMessage(content=" ".join(rng.choice(_WORDS) for _ in range(completion_tokens)))
+
+        time.sleep(self.first_token_latency + completion_tokens / self.tokens_per_second)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# === Local web fixtures ===
+
+_PAGE = """<html><head><title>Fixture {n}</title><script>var x = 1;</script></head>
+<body><nav>menu</nav><article><h1>Fixture page {n}</h1><p>{body}</p></article><footer>footer</footer></body></html>"""
+
+
+def start_fixture_server(port: int = 0, latency: float = 0.05, page_words: int = 800) -> ThreadingHTTPServer:
+    """Starts a background HTTP server serving /page/<n>. Returns the server (see .server_port)."""
+    body = " ".join(_WORDS[i % len(_WORDS)] for i in range(page_words))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            payload = _PAGE.format(n=self.path.rsplit("/", 1)[-1], body=body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass # Keep benchmark output clean
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server
+
+
+def make_fake_search(base_url: str, links: int = 3):
+    """Returns a drop-in replacement for tools.duckduckgo_search pointing at the fixture server."""
+    def fake_duckduckgo_search(query: str) -> list:
+        start = abs(hash(query)) % 100
+        return [f"{base_url}/page/{start + i}" for i in range(links)]
+    return fake_duckduckgo_search
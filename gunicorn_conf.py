@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for multi-worker deployments.
+
+    gunicorn -c gunicorn_conf.py app.main:app
+
+With PRELOAD_MODELS=true the app, the embedding model and the FAISS index are
+loaded once in the master before the workers are forked, so all workers share
+that memory copy-on-write instead of each loading its own copy.
+"""
+import os
+
+from app.core.config import settings
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Import app.main in the master (required for sharing anything across workers)
+preload_app = settings.preload_models
+
+
+def on_starting(server):
+    # Runs in the master after the app was preloaded and before any fork
+    if settings.preload_models:
+        from app.core.readiness import preload_shared_resources
+        preload_shared_resources()
+
+
+def post_fork(server, worker):
+    from app.core.readiness import configure_worker_after_fork
+    configure_worker_after_fork()
@@ -6,9 +6,9 @@ import numpy as np
 
 from langchain_community.document_loaders import TextLoader, DirectoryLoader # Or other loaders like CSVLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings # Use settings for consistency
+from app.rag.embeddings import create_embedding_backend
 
 def ingest_data(source_dir: str, chunk_size: int = 1000, chunk_overlap: int = 150):
     """Loads data, splits, embeds, and saves to FAISS and metadata file."""
@@ -58,8 +58,8 @@ def ingest_data(source_dir: str, chunk_size: int = 1000, chunk_overlap: int = 15
         chunk_texts = [chunk.page_content for chunk in chunks]
 
         # 3. Load embedding model
-        print(f"Loading embedding model: {settings.embedding_model_name}")
-        model = SentenceTransformer(settings.embedding_model_name)
+        print(f"Loading embedding model: {settings.embedding_model_name} (backend: {settings.embedding_backend})")
+        model = create_embedding_backend()
         print("Embedding model loaded.")
 
         # 4. Embed chunks